@@ -1,16 +1,25 @@
 from pathlib import Path
-from collections import OrderedDict
 
-from pxr import Gf
+from mocap.Writer.BaseWriter import TimesampleChunk
 from mocap.Writer.USDWriter import USDWriter
 
-from bvh import Bvh
+from .BVHParser import BVHData, BVHStream
 
+# meters per BVH unit, BVHWriter writes centimeters
+BVH_UNITS = {"m": 1.0, "cm": 0.01, "mm": 0.001}
 
-def composeFromBVH(infile: Path, output_base: Path, stride: int):
-    bvh = None
-    with infile.open() as f:
-        bvh = Bvh(f.read())
+
+def composeFromBVH(
+    infile: Path,
+    output_base: Path,
+    stride: int,
+    jobs: int = None,
+    writerOptions: dict = None,
+    bvhUnits: str = "cm",
+):
+    # writerOptions are extra USDWriter kwargs for the clip writers, e.g. the keyframe tolerances
+    writerOptions = dict(writerOptions or dict(), metersPerUnit=BVH_UNITS[bvhUnits])
+    bvh = BVHStream(infile)
 
     usdMain = infile.with_suffix("").name
     usd = USDWriter(
@@ -18,22 +27,29 @@ def composeFromBVH(infile: Path, output_base: Path, stride: int):
         output_base=output_base,
         stride=stride,
         framesPerSecond=round(1.0 / bvh.frame_time),
+        clip_workers=0,
     )
 
     usd.initialFrame_ = 0
-    usd.lastFrame_ = bvh.nframes
+    usd.lastFrame_ = bvh.nframes - 1
 
-    composeSkeleton(usd, bvh)
-    composeAnimation(usdMain, output_base, stride, bvh, usd.skeleton_)
+    skeleton = composeSkeleton(usd, bvh)
+    failures = composeAnimation(usdMain, output_base, stride, bvh, skeleton, jobs, writerOptions)
 
     usd.frameTimes_.append(0)
     usd.frameTimes_.append(bvh.frame_time)
     usd.frameTimes_.append(bvh.frame_time * 2)
 
     usd.close()
+    bvh.close()
+
+    if len(failures) > 0:
+        raise RuntimeError(
+            "failed to convert frames {}".format(", ".join(f"{first}-{last}" for first, last, _ in failures))
+        )
 
 
-def composeSkeleton(usd: USDWriter, bvh: Bvh):
+def composeSkeleton(usd: USDWriter, bvh: BVHData):
     skeleton = list()
 
     joints = bvh.get_joints_names()
@@ -54,97 +70,70 @@ def composeSkeleton(usd: USDWriter, bvh: Bvh):
         skeleton.append(tmp)
 
     usd.updateSkeleton(skeleton)
+    return skeleton
 
 
-def composeAnimation(outfile: str, output_base: Path, stride: int, bvh: Bvh, skeleton):
-    import multiprocessing
-
-    pool = list()
-
-    for chunk in range((bvh.nframes // stride) + 1):
-        pool.append(
-            multiprocessing.Process(
-                target=traverseBVH,
-                args=(
-                    outfile,
-                    output_base,
-                    stride,
-                    bvh,
-                    skeleton,
-                    chunk * stride,
-                    ((chunk + 1) * stride) - 1,
-                ),
-            )
-        )
-        pool[-1].start()
+def composeAnimation(
+    outfile: str,
+    output_base: Path,
+    stride: int,
+    bvh: BVHData,
+    skeleton: list,
+    jobs: int = None,
+    writerOptions: dict = None,
+) -> list:
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    ranges = [(start, min(start + stride, bvh.nframes) - 1) for start in range(0, bvh.nframes, stride)]
+    failures = list()
+
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=initChunkWorker,
+        initargs=(outfile, output_base, stride, bvh, skeleton, writerOptions or dict()),
+    ) as executor:
+        futures = {executor.submit(traverseChunk, *r): r for r in ranges}
+        for done, future in enumerate(as_completed(futures), 1):
+            start_frame, last_frame = futures[future]
+            try:
+                future.result()
+                print(f"[{done}/{len(ranges)}] frames {start_frame}-{last_frame}")
+            except Exception as e:
+                failures.append((start_frame, last_frame, e))
+                print(f"[{done}/{len(ranges)}] frames {start_frame}-{last_frame} FAILED: {e}")
 
-    for t in pool:
-        t.join()
+    return failures
+
+
+CHUNK_WORKER_ARGS = tuple()
+
+
+def initChunkWorker(*args):
+    global CHUNK_WORKER_ARGS
+    CHUNK_WORKER_ARGS = args
+
+
+def traverseChunk(start_frame: int, last_frame: int):
+    traverseBVH(*CHUNK_WORKER_ARGS, start_frame, last_frame)
 
 
 def traverseBVH(
-    outfile: str, output_base: Path, stride: int, bvh: Bvh, skeleton: OrderedDict, start_frame: int, last_frame: int
+    outfile: str,
+    output_base: Path,
+    stride: int,
+    bvh: BVHData,
+    skeleton: list,
+    writerOptions: dict,
+    start_frame: int,
+    last_frame: int,
 ):
-    usd = USDWriter(outfile, output_base=output_base, stride=stride)
+    usd = USDWriter(outfile, output_base=output_base, stride=stride, clip_workers=0, **writerOptions)
     usd.initialFrame_ = 0
     usd.updateSkeleton(skeleton)
-    joints = bvh.get_joints_names()
-    for frame in range(start_frame, min(last_frame, bvh.nframes)):
-        tmp = dict()
-        tmp["fnum"] = frame
-        tmp["uttm"] = frame * bvh.frame_time
-        tmp["btrs"] = list()
-        for j in joints:
-            ttmp = dict()
-            rot, tra = composeRotationTranslation(bvh, j, frame)
-
-            ttmp["bnid"] = bvh.get_joint_index(j)
-            ttmp["tran"] = dict()
-            ttmp["tran"]["rotation"] = rot
-            ttmp["tran"]["translation"] = tra
-
-            tmp["btrs"].append(ttmp)
-        usd.addTimesample(tmp)
-    usd.flushTimesample()
 
-
-def composeRotationTranslation(bvh: Bvh, joint: str, frame: int):
-    ROTATION_AXIS = {
-        "X": (
-            1,
-            0,
-            0,
-        ),
-        "Y": (
-            0,
-            1,
-            0,
-        ),
-        "Z": (
-            0,
-            0,
-            1,
-        ),
-    }
-    TRANSLATION_INDEX = {
-        "X": 0,
-        "Y": 1,
-        "Z": 2,
-    }
-
-    rot = Gf.Rotation().SetIdentity()
-    tra = [0, 0, 0]
-
-    for ch in bvh.joint_channels(joint):
-        val = bvh.frame_joint_channel(frame, joint, ch)
-        if "rotation" in ch:
-            rot *= Gf.Rotation(ROTATION_AXIS[ch[0]], val)
-        elif "position" in ch:
-            tra[TRANSLATION_INDEX[ch[0]]] = val
-
-    r = Gf.Quatf(rot.GetQuat())
-
-    return (
-        *r.GetImaginary(),
-        r.GetReal(),
-    ), Gf.Vec3f(*tra)
+    rotations, translations = bvh.localTransforms(start_frame, min(last_frame + 1, bvh.nframes))
+    if len(rotations) > 0:
+        chunk = TimesampleChunk(start_frame, stride, len(bvh.joints))
+        chunk.setFrames(0, rotations, translations)
+        usd.addTimesampleChunk(chunk)
+    usd.flushTimesample()
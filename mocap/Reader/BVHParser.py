@@ -0,0 +1,216 @@
+import mmap
+from pathlib import Path
+
+import numpy as np
+
+from mocap.Writer.quatMath import quatFromAxisAngle, quatMultiply
+
+AXIS_INDEX = {
+    "X": 0,
+    "Y": 1,
+    "Z": 2,
+}
+
+
+class BVHData:
+    def __init__(self):
+        self.joints = list()
+        self.parents = list()
+        self.offsets = list()
+        self.channels = list()
+        self.frame_time = 0.0
+        self.nframes = 0
+        self.motion = np.zeros((0, 0), dtype=np.float32)
+
+    def _compile(self):
+        J = len(self.joints)
+        self.parents = np.asarray(self.parents, dtype=np.int32)
+        self.offsets = np.asarray(self.offsets, dtype=np.float32).reshape(J, 3)
+        self._jointIndex = {name: i for i, name in enumerate(self.joints)}
+
+        # column of every rotation/position channel, -1 where the joint has none
+        self.rotationColumns = np.full((J, 3), -1, dtype=np.int64)
+        self.rotationAxises = np.zeros((J, 3), dtype=np.int64)
+        self.positionColumns = np.full((J, 3), -1, dtype=np.int64)
+        column = 0
+        for j, chs in enumerate(self.channels):
+            slot = 0
+            for ch in chs:
+                if ch.endswith("rotation") and slot < 3:
+                    self.rotationColumns[j, slot] = column
+                    self.rotationAxises[j, slot] = AXIS_INDEX[ch[0]]
+                    slot += 1
+                elif ch.endswith("position"):
+                    self.positionColumns[j, AXIS_INDEX[ch[0]]] = column
+                column += 1
+        self.nchannels = column
+
+    def get_joints_names(self):
+        return list(self.joints)
+
+    def get_joint_index(self, name: str):
+        return self._jointIndex[name]
+
+    def joint_parent_index(self, name: str):
+        return int(self.parents[self._jointIndex[name]])
+
+    def joint_offset(self, name: str):
+        return tuple(self.offsets[self._jointIndex[name]].tolist())
+
+    def joint_channels(self, name: str):
+        return self.channels[self._jointIndex[name]]
+
+    def frames(self, start: int = 0, stop: int = None):
+        return self.motion[start:stop]
+
+    def localTransforms(self, start: int = 0, stop: int = None):
+        # rotations [frames, joints, 4] as (x, y, z, w) and translations [frames, joints, 3]
+        motion = self.frames(start, stop)
+        padded = np.concatenate([motion, np.zeros((len(motion), 1), dtype=motion.dtype)], axis=1)
+
+        # missing channels read the zero column appended above
+        angles = padded[:, self.rotationColumns].astype(np.float64)
+        rotations = quatFromAxisAngle(self.rotationAxises[:, 0], angles[:, :, 0])
+        for slot in range(1, 3):
+            rotations = quatMultiply(quatFromAxisAngle(self.rotationAxises[:, slot], angles[:, :, slot]), rotations)
+
+        translations = padded[:, self.positionColumns]
+        translations = np.where(self.positionColumns < 0, self.offsets, translations)
+
+        return rotations.astype(np.float32), translations.astype(np.float32)
+
+
+def parseHierarchy(bvh: BVHData, tokens: list):
+    stack = list()
+    pending = None
+    i = 0
+    while i < len(tokens):
+        t = tokens[i]
+        if t in ("ROOT", "JOINT"):
+            bvh.joints.append(tokens[i + 1])
+            bvh.parents.append(stack[-1] if len(stack) > 0 else -1)
+            bvh.offsets.append((0.0, 0.0, 0.0))
+            bvh.channels.append(tuple())
+            pending = len(bvh.joints) - 1
+            i += 2
+        elif t == "End":
+            pending = None
+            i += 2
+        elif t == "{":
+            stack.append(pending)
+            i += 1
+        elif t == "}":
+            stack.pop()
+            i += 1
+        elif t == "OFFSET":
+            if stack[-1] is not None:
+                bvh.offsets[stack[-1]] = tuple(float(v) for v in tokens[i + 1 : i + 4])
+            i += 4
+        elif t == "CHANNELS":
+            n = int(tokens[i + 1])
+            bvh.channels[stack[-1]] = tuple(tokens[i + 2 : i + 2 + n])
+            i += 2 + n
+        else:
+            i += 1
+
+
+def parseBVH(text: str) -> BVHData:
+    hierarchy, _, motion = text.partition("MOTION")
+
+    bvh = BVHData()
+    parseHierarchy(bvh, hierarchy.split())
+    bvh._compile()
+
+    lines = motion.lstrip().split("\n", 2)
+    for line in lines[:2]:
+        key, _, value = line.partition(":")
+        if key.strip() == "Frames":
+            bvh.nframes = int(value)
+        elif key.strip() == "Frame Time":
+            bvh.frame_time = float(value)
+
+    values = np.fromstring(lines[2] if len(lines) > 2 else "", dtype=np.float32, sep=" ")
+    bvh.motion = values[: bvh.nframes * bvh.nchannels].reshape(-1, bvh.nchannels)
+    bvh.nframes = len(bvh.motion)
+    return bvh
+
+
+class BVHStream(BVHData):
+    # MOTION stays on disk, only the byte range of each frame row is kept in memory
+    SCAN_BLOCK = 1 << 24
+
+    def __init__(self, file: Path):
+        super().__init__()
+        self._file = Path(file)
+        self._mm = None
+
+        mm = self._map()
+        motion = mm.find(b"MOTION")
+        if motion < 0:
+            raise RuntimeError(f"{self._file} has no MOTION section")
+        parseHierarchy(self, mm[:motion].decode().split())
+        self._compile()
+
+        offset = mm.find(b"\n", motion) + 1
+        for _ in range(2):
+            end = mm.find(b"\n", offset)
+            end = len(mm) if end < 0 else end
+            key, _, value = mm[offset:end].decode().partition(":")
+            if key.strip() == "Frames":
+                self.nframes = int(value)
+            elif key.strip() == "Frame Time":
+                self.frame_time = float(value)
+            offset = end + 1
+
+        starts, ends = self._scanRows(offset)
+        self.nframes = min(self.nframes, len(starts))
+        self._rowStarts = starts[: self.nframes]
+        self._rowEnds = ends[: self.nframes]
+
+    def _map(self):
+        if self._mm is None:
+            with self._file.open("rb") as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mm
+
+    def _scanRows(self, begin: int):
+        mm = self._map()
+        newlines = list()
+        pos = begin
+        while pos < len(mm):
+            n = min(self.SCAN_BLOCK, len(mm) - pos)
+            block = np.frombuffer(mm, dtype=np.uint8, count=n, offset=pos)
+            newlines.append(np.flatnonzero(block == ord("\n")) + pos)
+            pos += n
+
+        ends = np.concatenate(newlines + [np.array([len(mm)])])
+        starts = np.concatenate([[begin], ends[:-1] + 1])
+        # skip blank lines
+        rows = (ends - starts) > 2
+        return starts[rows], ends[rows]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_mm"] = None
+        return state
+
+    def frames(self, start: int = 0, stop: int = None):
+        start, stop, _ = slice(start, stop).indices(self.nframes)
+        if stop <= start:
+            return np.zeros((0, self.nchannels), dtype=np.float32)
+        text = self._map()[self._rowStarts[start] : self._rowEnds[stop - 1]].decode()
+        values = np.fromstring(text, dtype=np.float32, sep=" ")
+        return values[: (stop - start) * self.nchannels].reshape(-1, self.nchannels)
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+def readBVH(file: Path) -> BVHData:
+    with Path(file).open() as f:
+        return parseBVH(f.read())
+
+
+__all__ = ["BVHData", "BVHStream", "parseBVH", "readBVH"]
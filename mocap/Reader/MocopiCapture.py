@@ -0,0 +1,104 @@
+import socket
+import struct
+from pathlib import Path
+
+import numpy as np
+
+CAPTURE_MAGIC = b"SMFCAP01"
+INDEX_MAGIC = b"SMFIDX01"
+
+# receive time, IPv6 (or IPv4-mapped) address, port, payload length
+RECORD_HEADER = struct.Struct("<d16sHI")
+# record offset, receive time
+INDEX_ENTRY = struct.Struct("<Qd")
+INDEX_DTYPE = np.dtype(
+    [
+        ("offset", "<u8"),
+        ("time", "<f8"),
+    ]
+)
+
+
+def indexPath(file: Path) -> Path:
+    return Path(file.as_posix() + ".idx")
+
+
+def packAddress(client_address) -> bytes:
+    host = client_address[0]
+    if ":" in host:
+        return socket.inet_pton(socket.AF_INET6, host)
+    return b"\x00" * 10 + b"\xff\xff" + socket.inet_pton(socket.AF_INET, host)
+
+
+def unpackAddress(address: bytes, port: int):
+    if address[:12] == b"\x00" * 10 + b"\xff\xff":
+        return (socket.inet_ntop(socket.AF_INET, address[12:]), port)
+    return (socket.inet_ntop(socket.AF_INET6, address), port)
+
+
+def buildIndex(file: Path):
+    entries = list()
+    with file.open("rb") as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise RuntimeError(f"{file} is not a capture file")
+        size = file.stat().st_size
+        offset = f.tell()
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                break
+            recvTime, _, _, length = RECORD_HEADER.unpack(header)
+            # a record cut off by an interrupted capture is left out
+            if offset + RECORD_HEADER.size + length > size:
+                break
+            entries.append((offset, recvTime))
+            offset += RECORD_HEADER.size + length
+            f.seek(offset)
+    return np.array(entries, dtype=INDEX_DTYPE)
+
+
+class CaptureReader:
+    def __init__(self, file: Path):
+        self._file = Path(file)
+        idx = indexPath(self._file)
+        self.index_ = None
+        if idx.exists():
+            with idx.open("rb") as f:
+                if f.read(len(INDEX_MAGIC)) == INDEX_MAGIC:
+                    entries = f.read()
+                    # an interrupted capture may leave a partial trailing entry
+                    entries = entries[: len(entries) - len(entries) % INDEX_ENTRY.size]
+                    self.index_ = np.frombuffer(entries, dtype=INDEX_DTYPE)
+        if self.index_ is None:
+            self.index_ = buildIndex(self._file)
+
+    def __len__(self):
+        return len(self.index_)
+
+    def times(self):
+        return self.index_["time"]
+
+    def find(self, recvTime: float) -> int:
+        return int(np.searchsorted(self.index_["time"], recvTime))
+
+    def records(self, start: int = 0, stop: int = None):
+        if stop is None:
+            stop = len(self.index_)
+        with self._file.open("rb") as f:
+            for offset in self.index_["offset"][start:stop]:
+                f.seek(int(offset))
+                # an interrupted capture may end in the middle of a record, the index may still list it
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                recvTime, address, port, length = RECORD_HEADER.unpack(header)
+                data = f.read(length)
+                if len(data) < length:
+                    break
+                yield recvTime, unpackAddress(address, port), data
+
+    def __iter__(self):
+        return self.records()
+
+
+__all__ = ["CaptureReader"]
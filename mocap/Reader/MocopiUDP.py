@@ -1,4 +1,9 @@
+import hashlib
 import struct
+import threading
+from collections import defaultdict
+
+import numpy as np
 
 FIELDS_RECURSIVE = [
     #
@@ -106,6 +111,101 @@ def parse_field_(data: bytes):
     return ret, offset
 
 
+class UnknownLayoutError(ValueError):
+    pass
+
+
+FIELD_HEADER = struct.Struct("<L4s")
+FIELD_NAMES = {name.encode("ascii"): name for name in FIELDS_RECURSIVE + FIELDS_PROMOTE}
+FIELDS_STRUCTS = {name.encode("ascii"): struct.Struct(fmt) for name, fmt in FIELDS_DATATYPES.items()}
+
+# btdt: bnid, tran
+BTDT_RECORD = struct.Struct("<L4sL4sHL4s7f")
+# bndt: bnid, pbid, tran
+BNDT_RECORD = struct.Struct("<L4sL4sHL4sHL4s7f")
+
+
+def parse_records_(mv: memoryview, name: bytes):
+    ret = list()
+    if name == b"btrs":
+        if len(mv) % BTDT_RECORD.size != 0:
+            raise UnknownLayoutError(name)
+        for r in BTDT_RECORD.iter_unpack(mv):
+            if r[:4] != (46, b"btdt", 2, b"bnid") or r[5:7] != (28, b"tran"):
+                raise UnknownLayoutError(name)
+            ret.append(
+                {
+                    "name": "btdt",
+                    "bnid": r[4],
+                    "tran": {
+                        "rotation": r[7:11],
+                        "translation": r[11:14],
+                    },
+                }
+            )
+    else:
+        if len(mv) % BNDT_RECORD.size != 0:
+            raise UnknownLayoutError(name)
+        for r in BNDT_RECORD.iter_unpack(mv):
+            if r[:4] != (56, b"bndt", 2, b"bnid") or r[5:7] != (2, b"pbid") or r[8:10] != (28, b"tran"):
+                raise UnknownLayoutError(name)
+            ret.append(
+                {
+                    "name": "bndt",
+                    "bnid": r[4],
+                    "pbid": r[7],
+                    "tran": {
+                        "rotation": r[10:14],
+                        "translation": r[14:17],
+                    },
+                }
+            )
+    return ret
+
+
+def parse_container_(mv: memoryview, name: str):
+    f = {"name": name}
+    offset = 0
+    while offset < len(mv):
+        length, child = FIELD_HEADER.unpack_from(mv, offset)
+        offset += FIELD_HEADER.size
+        raw = mv[offset : offset + length]
+        if len(raw) != length:
+            raise UnknownLayoutError(child)
+        offset += length
+
+        if child in FIELDS_STRUCTS:
+            fmt = FIELDS_STRUCTS[child]
+            if fmt.size != length:
+                raise UnknownLayoutError(child)
+            f[FIELD_NAMES[child]] = fmt.unpack_from(raw)[0]
+        elif child == b"ftyp":
+            f["ftyp"] = bytes(raw).decode("ascii")
+        elif child in (b"btrs", b"bons") and name in ("fram", "skdf") and "btrs" not in f:
+            f["btrs"] = parse_records_(raw, child)
+        else:
+            raise UnknownLayoutError(child)
+    return f
+
+
+def parse_packet_fast_(data: bytes, skip=()):
+    # fields named in skip are left as None, for the caller to fill in
+    mv = memoryview(data)
+    ret = dict()
+    offset = 0
+    while offset < len(mv):
+        length, name = FIELD_HEADER.unpack_from(mv, offset)
+        offset += FIELD_HEADER.size
+        if name not in (b"head", b"sndf", b"fram", b"skdf") or offset + length > len(mv):
+            raise UnknownLayoutError(name)
+        if name in skip:
+            ret[FIELD_NAMES[name]] = None
+        else:
+            ret[FIELD_NAMES[name]] = parse_container_(mv[offset : offset + length], FIELD_NAMES[name])
+        offset += length
+    return ret
+
+
 class MocopiPacket:
     def __init__(self, data: bytes):
         self.fields_ = dict()
@@ -130,6 +230,213 @@ class MocopiPacket:
         return "sdkf" in self.fields_
 
 
-def decomposePacket(data: bytes) -> dict:
+BTDT_DTYPE = np.dtype(
+    [
+        ("length", "<u4"),
+        ("name", "S4"),
+        ("bnid_length", "<u4"),
+        ("bnid_name", "S4"),
+        ("bnid", "<u2"),
+        ("tran_length", "<u4"),
+        ("tran_name", "S4"),
+        ("rotation", "<f4", (4,)),
+        ("translation", "<f4", (3,)),
+    ]
+)
+
+
+def split_packets_(data: bytes):
+    mv = memoryview(data)
+    ret = list()
+    begin = 0
+    offset = 0
+    while offset + FIELD_HEADER.size <= len(mv):
+        length, name = FIELD_HEADER.unpack_from(mv, offset)
+        if name == b"head" and offset > begin:
+            ret.append(mv[begin:offset])
+            begin = offset
+        offset += FIELD_HEADER.size + length
+    if begin < len(mv):
+        ret.append(mv[begin:])
+    return ret
+
+
+def motion_layout_(data: bytes):
+    # byte offsets of fnum/uttm/btrs inside a fram packet, plus every field header on the way; None unless every field
+    # stays inside the packet, the strided views built from it must never reach into the next one
+    mv = memoryview(data)
+    layout = {"headers": list(), "uttm": None}
+    offset = 0
+    while offset < len(mv):
+        if offset + FIELD_HEADER.size > len(mv):
+            return None
+        length, name = FIELD_HEADER.unpack_from(mv, offset)
+        layout["headers"].append(offset)
+        offset += FIELD_HEADER.size
+        if offset + length > len(mv):
+            return None
+        if name == b"fram":
+            end = offset + length
+            child_offset = offset
+            while child_offset < end:
+                if child_offset + FIELD_HEADER.size > end:
+                    return None
+                child_length, child = FIELD_HEADER.unpack_from(mv, child_offset)
+                layout["headers"].append(child_offset)
+                child_offset += FIELD_HEADER.size
+                if child_offset + child_length > end:
+                    return None
+                if child == b"fnum" and child_length == 4:
+                    layout["fnum"] = child_offset
+                elif child == b"uttm" and child_length == 8:
+                    layout["uttm"] = child_offset
+                elif child == b"btrs":
+                    if child_length % BTDT_DTYPE.itemsize != 0:
+                        return None
+                    layout["btrs"] = child_offset
+                    layout["joints"] = child_length // BTDT_DTYPE.itemsize
+                child_offset += child_length
+        offset += length
+
+    if "fnum" not in layout or "btrs" not in layout:
+        return None
+    return layout
+
+
+def decomposeMotionPackets(packets) -> dict:
+    if isinstance(packets, (bytes, bytearray, memoryview)):
+        packets = split_packets_(packets)
+
+    groups = defaultdict(list)
+    for i, p in enumerate(packets):
+        groups[len(p)].append(i)
+
+    results = list()
+    for length, indices in groups.items():
+        buffer = b"".join(packets[i] for i in indices)
+        blob = np.frombuffer(buffer, dtype=np.uint8).reshape(len(indices), length)
+        indices = np.asarray(indices)
+
+        # packets of this length not decoded yet, the first one is the template for all laid out like it;
+        # a template that turns out not to be a motion packet is skipped like skdf
+        pending = np.arange(len(indices))
+        while len(pending) > 0:
+            template = pending[0]
+            layout = motion_layout_(memoryview(buffer)[template * length : (template + 1) * length])
+            if layout is None:
+                pending = pending[1:]
+                continue
+
+            headers = np.add.outer(layout["headers"], np.arange(FIELD_HEADER.size)).ravel()
+            consistent = (blob[np.ix_(pending, headers)] == blob[template, headers]).all(axis=1)
+
+            records = np.ndarray(
+                (len(indices), layout["joints"]),
+                dtype=BTDT_DTYPE,
+                buffer=buffer,
+                offset=layout["btrs"],
+                strides=(length, BTDT_DTYPE.itemsize),
+            )[pending]
+            consistent &= (records["name"] == b"btdt").all(axis=1)
+            consistent &= (records["bnid_name"] == b"bnid").all(axis=1)
+            consistent &= (records["tran_name"] == b"tran").all(axis=1)
+
+            fnum = np.ndarray((len(indices),), dtype="<u4", buffer=buffer, offset=layout["fnum"], strides=(length,))
+            if layout["uttm"] is not None:
+                uttm = np.ndarray(
+                    (len(indices),), dtype="<f8", buffer=buffer, offset=layout["uttm"], strides=(length,)
+                )[pending]
+            else:
+                uttm = np.full(len(pending), np.nan)
+
+            if consistent.any():
+                records = records[consistent]
+                results.append(
+                    {
+                        "index": indices[pending[consistent]],
+                        "fnum": fnum[pending[consistent]],
+                        "uttm": uttm[consistent],
+                        "bnid": records["bnid"][0],
+                        "rotation": records["rotation"],
+                        "translation": records["translation"],
+                    }
+                )
+
+            # the template leaves either way, so a broken one cannot stall the loop
+            consistent[0] = True
+            pending = pending[~consistent]
+
+    joints = {r["rotation"].shape[1] for r in results}
+    if len(joints) > 1:
+        raise ValueError("inconsistent joint count across packets: {}".format(sorted(joints)))
+    J = joints.pop() if len(joints) > 0 else 0
+
+    if len(results) == 0:
+        return {
+            "fnum": np.zeros(0, dtype=np.uint32),
+            "uttm": np.zeros(0, dtype=np.float64),
+            "bnid": np.zeros(0, dtype=np.uint16),
+            "rotation": np.zeros((0, J, 4), dtype=np.float32),
+            "translation": np.zeros((0, J, 3), dtype=np.float32),
+        }
+
+    order = np.argsort(np.concatenate([r["index"] for r in results]), kind="stable")
+    return {
+        "fnum": np.concatenate([r["fnum"] for r in results]).astype(np.uint32)[order],
+        "uttm": np.concatenate([r["uttm"] for r in results]).astype(np.float64)[order],
+        "bnid": results[0]["bnid"].astype(np.uint16),
+        "rotation": np.concatenate([r["rotation"] for r in results]).astype(np.float32)[order],
+        "translation": np.concatenate([r["translation"] for r in results]).astype(np.float32)[order],
+    }
+
+
+def decode_packet_(data: bytes) -> dict:
+    try:
+        return parse_packet_fast_(data)
+    except (UnknownLayoutError, struct.error):
+        pass
     mocoPacket = MocopiPacket(data)
     return mocoPacket.getData()
+
+
+# decoded skdf fields keyed by skeletonFingerprint, suits resend the same skeleton over and over
+SKELETON_CACHE = dict()
+SKELETON_CACHE_SIZE = 32
+SKELETON_CACHE_LOCK = threading.Lock()
+
+
+def skeletonFingerprint(data: bytes):
+    # digest of the skdf field alone, so the sender address in sndf does not matter; None for other packets
+    offset = 0
+    while offset + FIELD_HEADER.size <= len(data):
+        length, name = FIELD_HEADER.unpack_from(data, offset)
+        if name == b"skdf":
+            field = memoryview(data)[offset : offset + FIELD_HEADER.size + length]
+            return hashlib.blake2b(field, digest_size=16).digest()
+        if name == b"fram":
+            return None
+        offset += FIELD_HEADER.size + length
+    return None
+
+
+def decomposePacket(data: bytes, fingerprint: bytes = None) -> dict:
+    if fingerprint is None:
+        return decode_packet_(data)
+
+    skdf = SKELETON_CACHE.get(fingerprint)
+    if skdf is None:
+        dec = decode_packet_(data)
+        if "skdf" in dec:
+            with SKELETON_CACHE_LOCK:
+                while len(SKELETON_CACHE) >= SKELETON_CACHE_SIZE:
+                    SKELETON_CACHE.pop(next(iter(SKELETON_CACHE)))
+                SKELETON_CACHE[fingerprint] = dec["skdf"]
+        return dec
+
+    # only the skeleton is shared and read-only, head and sndf belong to this sender
+    try:
+        dec = parse_packet_fast_(data, skip=(b"skdf",))
+    except (UnknownLayoutError, struct.error):
+        return decode_packet_(data)
+    dec["skdf"] = skdf
+    return dec
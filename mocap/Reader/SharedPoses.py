@@ -0,0 +1,261 @@
+import atexit
+import os
+import threading
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+SHM_MAGIC = b"SMFSHM01"
+SHM_NAME = "smf_poses"
+MAX_CLIENTS = 64
+
+HEADER_DTYPE = np.dtype(
+    [
+        ("magic", "S8"),
+        ("slots", "<u4"),
+        ("joints", "<u4"),
+        # frames published so far, the newest one lives in slot (sequence - 1) % slots
+        ("sequence", "<u8"),
+        # pid of the receiver publishing into the ring
+        ("owner", "<u8"),
+    ]
+)
+CLIENT_DTYPE = np.dtype([("name", "S64")])
+
+
+def slotDtype(joints: int):
+    # sequence is a seqlock: odd while the slot is being written, 2 * (frame sequence + 1) once it is complete
+    return np.dtype(
+        [
+            ("sequence", "<u8"),
+            ("client", "<u4"),
+            ("fnum", "<u4"),
+            ("time", "<f8"),
+            ("joints", "<u4"),
+            ("reserved", "<u4"),
+            # rotation x, y, z, w then translation x, y, z, joints sorted by bnid
+            ("pose", "<f4", (joints, 7)),
+        ]
+    )
+
+
+def segmentSize(slots: int, joints: int):
+    return HEADER_DTYPE.itemsize + CLIENT_DTYPE.itemsize * MAX_CLIENTS + slotDtype(joints).itemsize * slots
+
+
+class PoseRing:
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool = False):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=shm.buf)
+        if self.header["magic"] != SHM_MAGIC:
+            raise ValueError(f"{shm.name} is not a pose ring")
+        self.clients = np.ndarray(MAX_CLIENTS, dtype=CLIENT_DTYPE, buffer=shm.buf, offset=HEADER_DTYPE.itemsize)
+        self.slots = np.ndarray(
+            int(self.header["slots"]),
+            dtype=slotDtype(int(self.header["joints"])),
+            buffer=shm.buf,
+            offset=HEADER_DTYPE.itemsize + CLIENT_DTYPE.itemsize * MAX_CLIENTS,
+        )
+
+    @classmethod
+    def create(cls, name: str = SHM_NAME, slots: int = 256, joints: int = 32):
+        shm = shared_memory.SharedMemory(name, create=True, size=segmentSize(slots, joints))
+        header = np.ndarray((), dtype=HEADER_DTYPE, buffer=shm.buf)
+        header["slots"] = slots
+        header["joints"] = joints
+        header["sequence"] = 0
+        header["owner"] = os.getpid()
+        header["magic"] = SHM_MAGIC
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str = SHM_NAME):
+        shm = shared_memory.SharedMemory(name)
+        # attaching registers the segment with this process's resource tracker, which would unlink it on exit;
+        # a ring published from this very process is already registered once and stays so
+        if name not in PUBLISHERS:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm)
+
+    def joints(self):
+        return int(self.header["joints"])
+
+    def close(self):
+        # numpy views pin the mapping, drop them before closing it
+        del self.header, self.clients, self.slots
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class SharedPoseReader:
+    # attaches to a running receiver, nothing here takes a lock or copies unless asked to
+    def __init__(self, name: str = SHM_NAME):
+        self._ring = PoseRing.attach(name)
+        self.slots = self._ring.slots
+
+    def __len__(self):
+        return len(self.slots)
+
+    def close(self):
+        del self.slots
+        self._ring.close()
+
+    def sequence(self):
+        return int(self._ring.header["sequence"])
+
+    def clients(self):
+        return {i: c.decode() for i, c in enumerate(self._ring.clients["name"].tolist()) if len(c) > 0}
+
+    def view(self, sequence: int):
+        # the live record for a frame sequence, zero-copy; check its sequence field to know if it is still that frame
+        return self.slots[sequence % len(self.slots)]
+
+    def read(self, sequence: int, out=None):
+        # (client, fnum, time, pose) of a published frame, None once it has been overwritten or is mid-write
+        slot = self.view(sequence)
+        expected = 2 * (sequence + 1)
+        if slot["sequence"] != expected:
+            return None
+        client, fnum, time, joints = int(slot["client"]), int(slot["fnum"]), float(slot["time"]), int(slot["joints"])
+        if out is None:
+            out = np.empty((joints, 7), dtype=np.float32)
+        np.copyto(out[:joints], slot["pose"][:joints])
+        if slot["sequence"] != expected:
+            return None
+        return client, fnum, time, out[:joints]
+
+    def latest(self, client: int = None, out=None):
+        # newest complete frame, optionally of a single client
+        newest = self.sequence()
+        for sequence in range(newest - 1, max(-1, newest - 1 - len(self.slots)), -1):
+            if client is not None and self.view(sequence)["client"] != client:
+                continue
+            frame = self.read(sequence, out)
+            if frame is not None:
+                return (sequence,) + frame
+        return None
+
+    def follow(self, since: int = None):
+        # sequences published after since, skipping ahead when the reader fell a whole ring behind
+        newest = self.sequence()
+        since = newest if since is None else max(since, newest - len(self.slots))
+        return range(since, newest)
+
+
+class PoseRingPublisher:
+    # shared by every writer in the receiver process, slots are claimed under a lock and written outside it
+    def __init__(self, ring: PoseRing):
+        self.ring = ring
+        self.lock = threading.Lock()
+        self.users = 0
+
+    def register(self, name: str):
+        with self.lock:
+            names = self.ring.clients["name"]
+            for i in range(MAX_CLIENTS):
+                if len(names[i]) == 0:
+                    names[i] = name.encode()[: CLIENT_DTYPE["name"].itemsize]
+                    return i
+        raise RuntimeError("no free client entry in the pose ring")
+
+    def unregister(self, client: int):
+        with self.lock:
+            self.ring.clients["name"][client] = b""
+
+    def publish(self, client: int, fnum: int, time: float, rotations, translations):
+        with self.lock:
+            sequence = int(self.ring.header["sequence"])
+            self.ring.header["sequence"] = sequence + 1
+        slot = self.ring.slots[sequence % len(self.ring.slots)]
+        joints = len(rotations)
+        slot["sequence"] = 2 * sequence + 1
+        slot["client"] = client
+        slot["fnum"] = fnum
+        slot["time"] = time
+        slot["joints"] = joints
+        pose = slot["pose"]
+        pose[:joints, :4] = rotations
+        pose[:joints, 4:] = translations
+        slot["sequence"] = 2 * (sequence + 1)
+
+
+def isAlive(pid: int):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def takeOverStale(name: str):
+    # only a pose ring whose receiver is gone is unlinked, anything else under that name is left alone
+    shm = shared_memory.SharedMemory(name)
+    # opening registers the segment for unlinking at exit, which must not happen to someone else's ring
+    resource_tracker.unregister(shm._name, "shared_memory")
+    try:
+        header = np.ndarray((), dtype=HEADER_DTYPE, buffer=shm.buf) if shm.size >= HEADER_DTYPE.itemsize else None
+        magic = header["magic"] if header is not None else None
+        owner = int(header["owner"]) if header is not None else 0
+        del header
+        if magic != SHM_MAGIC:
+            raise RuntimeError(f"shared memory {name} exists and is not a pose ring, pick another --shm-name")
+        if owner != os.getpid() and isAlive(owner):
+            raise RuntimeError(f"pose ring {name} is in use by process {owner}, pick another --shm-name")
+        resource_tracker.register(shm._name, "shared_memory")
+        shm.unlink()
+    finally:
+        shm.close()
+
+
+PUBLISHERS = dict()
+PUBLISHERS_LOCK = threading.Lock()
+
+
+def openPublisher(name: str = SHM_NAME, slots: int = 256, joints: int = 32):
+    with PUBLISHERS_LOCK:
+        publisher = PUBLISHERS.get(name)
+        if publisher is None:
+            try:
+                ring = PoseRing.create(name, slots, joints)
+            except FileExistsError:
+                takeOverStale(name)
+                ring = PoseRing.create(name, slots, joints)
+            publisher = PUBLISHERS[name] = PoseRingPublisher(ring)
+            if len(PUBLISHERS) == 1:
+                atexit.register(closePublishers)
+        publisher.users += 1
+        return publisher
+
+
+def closePublisher(publisher: PoseRingPublisher):
+    # the ring outlives its writers, readers attached to it would be left on a dead segment otherwise
+    with PUBLISHERS_LOCK:
+        publisher.users -= 1
+
+
+def closePublishers():
+    # unlinks every ring at receiver shutdown, or at exit when nobody did
+    with PUBLISHERS_LOCK:
+        if len(PUBLISHERS) > 0:
+            atexit.unregister(closePublishers)
+        for publisher in PUBLISHERS.values():
+            publisher.ring.close()
+        PUBLISHERS.clear()
+
+
+__all__ = [
+    "SHM_NAME",
+    "slotDtype",
+    "segmentSize",
+    "PoseRing",
+    "SharedPoseReader",
+    "PoseRingPublisher",
+    "openPublisher",
+    "closePublisher",
+    "closePublishers",
+]
@@ -1,105 +1,227 @@
+import io
+import os
 import tempfile
-import threading
 
-from pxr import Gf
+from concurrent.futures import Future
+
+import numpy as np
+
 from .BaseWriter import BaseWriter
-from .skelTree import SkelNode
+from .quatMath import quatToEuler
+from .skelTree import FlatSkeleton, SkelNode
+
+# Frames and Frame Time are written padded to this width and patched in place at close
+HEADER_FIELD_WIDTH = 16
+BVH_MODES = ["stream", "merge"]
 
 
 class BVHWriter(BaseWriter):
-    def __init__(self, *args, decomposeAxises=SkelNode.ZXY, **kwargs):
+    def __init__(self, *args, decomposeAxises=SkelNode.ZXY, unwrapEuler=True, bvh_mode="stream", **kwargs):
         super().__init__(*args, **kwargs, output_extension=".bvh")
 
         self._baseDir.absolute().mkdir(parents=True, exist_ok=True)
 
         self._decomposeAxises = decomposeAxises
+        self._unwrapEuler = unwrapEuler
         self._tempFiles = dict()
 
+        self._streaming = bvh_mode == "stream"
+        self._stream = None
+        self._headerPosition = None
+        self._pendingRows = dict()
+        self._nextFrame = 0
+        self._lastRow = None
+        self._lastMotion = None
+
     def close(self):
         self.flushTimesample()
         self._solveFPS()
 
-        with self._mainFile.open("w") as f:
-            hierarchy(f, self.skeleton_, self._decomposeAxises)
-            self._mergeAnimation(f)
+        if not self._streaming:
+            with self._mainFile.open("w") as f:
+                hierarchy(f, self.skeleton_, self._decomposeAxises)
+                self._mergeAnimation(f)
+            return
+
+        if self._stream is None:
+            self._openStream()
+        self._drainRows(wait=True)
+        self._stream.seek(self._headerPosition)
+        self._stream.write(motionHeader(self._nextFrame, 1.0 / self._fps))
+        self._stream.close()
+
+    def updateSkeleton(self, skeleton: list):
+        super().updateSkeleton(skeleton)
+        # the hierarchy is fixed once MOTION has started, later skeletons only matter to merge mode
+        if self._streaming and self._stream is None and len(skeleton) > 0:
+            self._openStream()
+            self._drainRows()
 
     def _writeAnimation(self, base, samples):
-        file = tempfile.TemporaryFile("w+")
-        self._tempFiles[base] = file
-        self._writeAnimationThreads.append(
-            threading.Thread(
-                target=saveAnimationFragment,
-                args=(file, base, samples, self._decomposeAxises),
+        if self._streaming:
+            self._pendingRows[base] = self._submitAnimation(
+                formatAnimationFragment, samples, self._decomposeAxises, self._unwrapEuler
             )
+            self._drainRows()
+            return
+
+        fd, file = tempfile.mkstemp(suffix=".bvh")
+        os.close(fd)
+        self._tempFiles[base] = (
+            file,
+            self._submitAnimation(
+                saveAnimationFragment, file, base, samples, self._decomposeAxises, self._unwrapEuler
+            ),
         )
-        self._writeAnimationThreads[-1].start()
+
+    def _openStream(self):
+        self._stream = self._mainFile.open("w")
+        hierarchy(self._stream, self.skeleton_, self._decomposeAxises)
+        print("MOTION", file=self._stream)
+        self._headerPosition = self._stream.tell()
+        self._stream.write(motionHeader(0, 0.0))
+
+    def _drainRows(self, wait: bool = False):
+        # rows go out in frame order, a chunk waits for every earlier chunk that may still be written
+        if self._stream is None:
+            return
+        while len(self._pendingRows) > 0:
+            base = min(self._pendingRows)
+            if len(self.timesamples_) > 0 and min(self.timesamples_) < base:
+                return
+            rows = self._pendingRows[base]
+            if isinstance(rows, Future):
+                if not wait and not rows.done():
+                    return
+                try:
+                    rows = rows.result()
+                except Exception:
+                    # flushTimesample reports it, the gap is held at the last pose
+                    rows = None
+            del self._pendingRows[base]
+            if rows is not None:
+                self._appendRows(*rows)
+
+    def _appendRows(self, frames, text: str, motion):
+        if len(frames) == 0:
+            return
+        # chunks are unwrapped on their own, carry the unwrap on from the last row written
+        offset = unwrapOffset(self._lastMotion, motion[0]) if self._unwrapEuler else None
+        if offset is not None:
+            motion = motion + offset
+            text = formatMotion(motion)
+        self._lastMotion = motion[-1]
+
+        if frames[0] == self._nextFrame and frames[-1] - frames[0] + 1 == len(frames):
+            self._stream.write(text)
+            self._nextFrame = int(frames[-1]) + 1
+            self._lastRow = text[text.rfind("\n", 0, len(text) - 1) + 1 :]
+            return
+
+        # lost or dropped frames repeat the previous pose so row N stays frame N
+        for frame, row in zip(frames.tolist(), text.splitlines(keepends=True)):
+            if frame < self._nextFrame:
+                continue
+            self._stream.write((self._lastRow or row) * (frame - self._nextFrame) + row)
+            self._nextFrame = frame + 1
+            self._lastRow = row
 
     def _mergeAnimation(self, file):
         print("MOTION", file=file)
         print(f"Frames: {self.lastFrame_+1}", file=file)
         print(f"Frame Time: {1.0 / self._fps}", file=file)
 
+        previous = None
         for base in sorted(self._tempFiles):
-            tmp = self._tempFiles.pop(base)
-            tmp.seek(0)
-            file.write(tmp.read())
-            tmp.close()
-
-
-def Specifier(skel):
-    return "ROOT" if skel.parent == 65535 else "JOINT"
-
-
-def dumpHierarchy(node, file, decomposeAxises, indent=0):
-    indentPrefix = "  " * indent
-    if indent == 0:
-        print("HIERARCHY", file=file)
-    print(indentPrefix, Specifier(node), " ", node.name(), sep="", file=file)
-    print(indentPrefix, "{", sep="", file=file)
-    print(indentPrefix, "  OFFSET {} {} {}".format(*[x * 100 for x in node.translation]), sep="", file=file)
-    print(indentPrefix, "  CHANNELS 6 Xposition Yposition Zposition {}".format(decomposeAxises[1]), sep="", file=file)
-    for c in node.children:
-        dumpHierarchy(c, file, decomposeAxises, indent + 1)
-    if len(node.children) == 0:
-        print(indentPrefix, "  End Site", sep="", file=file)
-        print(indentPrefix, "  {", sep="", file=file)
-        print(indentPrefix, "    OFFSET 0 0 0", sep="", file=file)
-        print(indentPrefix, "  }", sep="", file=file)
-    print(indentPrefix, "}", sep="", file=file)
+            tmp, edges = self._tempFiles.pop(base)
+            try:
+                first, last = edges.result() if isinstance(edges, Future) else edges
+            except Exception:
+                # flushTimesample reports it, or the chunk had no rows
+                first = last = None
+
+            # chunks are unwrapped on their own, carry the unwrap on across the merged rows
+            offset = unwrapOffset(previous, first) if self._unwrapEuler else None
+            if offset is not None:
+                file.write(formatMotion(np.loadtxt(tmp, ndmin=2) + offset))
+                last = last + offset
+            else:
+                with open(tmp) as f:
+                    file.write(f.read())
+            previous = last if last is not None else previous
+            os.remove(tmp)
+
+
+def motionHeader(frames: int, frameTime: float):
+    w = HEADER_FIELD_WIDTH
+    return f"Frames: {frames:<{w}d}\nFrame Time: {frameTime:<{w}.10f}\n"
 
 
 def hierarchy(file, skeleton: list, decomposeAxises):
-    skel = None
-    for s in sorted(skeleton, key=lambda x: x["bnid"]):
-        if skel is None:
-            skel = SkelNode(s["bnid"], s["tran"]["rotation"], s["tran"]["translation"], s["pbid"])
-        else:
-            skel.append(SkelNode(s["bnid"], s["tran"]["rotation"], s["tran"]["translation"], s["pbid"]))
-    dumpHierarchy(skel, file, decomposeAxises)
-
-
-def saveAnimationFragment(file, base, samples, decomposeAxises):
-    # with tmp.open("w") as file:
-    for frame, poses in sorted(samples.items()):
-        # Xposition Yposition Zposition Zrotation Xrotation Yrotation
-        for pose in sorted(poses["btrs"], key=lambda x: x["bnid"]):
-            t = pose["tran"]["translation"]
-            rotation = pose["tran"]["rotation"]
-            quat = Gf.Rotation(Gf.Quaternion(rotation[3], Gf.Vec3d(rotation[0], rotation[1], rotation[2])))
-            r = quat.Decompose(*decomposeAxises[0])
-            print(
-                round(t[0] * 100, 5),
-                round(t[1] * 100, 5),
-                round(t[2] * 100, 5),
-                round(r[0], 5),
-                round(r[1], 5),
-                round(r[2], 5),
-                sep=" ",
-                file=file,
-                end=" ",
-            )
-        print(file=file)
-    file.flush()
+    skel = skeleton if isinstance(skeleton, FlatSkeleton) else FlatSkeleton.fromSkdf(skeleton)
+
+    def closeJoint(index):
+        indentPrefix = "  " * skel.depths[index]
+        if len(skel.children[index]) == 0:
+            print(indentPrefix, "  End Site", sep="", file=file)
+            print(indentPrefix, "  {", sep="", file=file)
+            print(indentPrefix, "    OFFSET 0 0 0", sep="", file=file)
+            print(indentPrefix, "  }", sep="", file=file)
+        print(indentPrefix, "}", sep="", file=file)
+
+    print("HIERARCHY", file=file)
+    opened = list()
+    for index in skel.order.tolist():
+        depth = skel.depths[index]
+        while len(opened) > depth:
+            closeJoint(opened.pop())
+        indentPrefix = "  " * depth
+        offset = [x * 100 for x in skel.translations[index].tolist()]
+        print(indentPrefix, "ROOT" if skel.isRoot(index) else "JOINT", " ", skel.names[index], sep="", file=file)
+        print(indentPrefix, "{", sep="", file=file)
+        print(indentPrefix, "  OFFSET {} {} {}".format(*offset), sep="", file=file)
+        print(
+            indentPrefix, "  CHANNELS 6 Xposition Yposition Zposition {}".format(decomposeAxises[1]), sep="", file=file
+        )
+        opened.append(index)
+    while len(opened) > 0:
+        closeJoint(opened.pop())
+
+
+def unwrapOffset(previous, first):
+    # whole turns that bring a chunk's rotation channels next to the row before it, None when there are none
+    if previous is None or first is None or len(previous) != len(first):
+        return None
+    # Xposition Yposition Zposition then three rotations per joint
+    rotation = np.arange(len(first)) % 6 >= 3
+    offset = np.where(rotation, 360.0 * np.round((previous - first) / 360.0), 0.0)
+    return offset if offset.any() else None
+
+
+def animationMotion(samples, decomposeAxises, unwrapEuler=True):
+    indices = samples.indices()
+    # Xposition Yposition Zposition Zrotation Xrotation Yrotation
+    translations = samples.translation[indices].astype(np.float64) * 100
+    rotations = quatToEuler(samples.rotation[indices], decomposeAxises[0], unwrap=unwrapEuler)
+    return np.concatenate([translations, rotations], axis=-1).reshape(len(indices), -1)
+
+
+def formatMotion(motion):
+    buffer = io.StringIO()
+    np.savetxt(buffer, motion, fmt="%.5f", delimiter=" ")
+    return buffer.getvalue()
+
+
+def saveAnimationFragment(tmp, base, samples, decomposeAxises, unwrapEuler=True):
+    motion = animationMotion(samples, decomposeAxises, unwrapEuler)
+    np.savetxt(tmp, motion, fmt="%.5f", delimiter=" ")
+    # first and last row, for the merge to carry the unwrap across chunks
+    return (motion[0], motion[-1]) if len(motion) > 0 else None
+
+
+def formatAnimationFragment(samples, decomposeAxises, unwrapEuler=True):
+    motion = animationMotion(samples, decomposeAxises, unwrapEuler)
+    return samples.frames(), formatMotion(motion), motion
 
 
-__all__ = ["BVHWriter"]
+__all__ = ["BVH_MODES", "BVHWriter"]
@@ -1,5 +1,62 @@
+import time
+
 from pathlib import Path
-from collections import defaultdict
+
+import numpy as np
+
+from .ClipWriterPool import getClipWriterPool
+
+
+class TimesampleChunk:
+    def __init__(self, base: int, stride: int, joints: int):
+        self.base = base
+        self.stride = stride
+        self.rotation = np.zeros((stride, joints, 4), dtype=np.float32)
+        self.translation = np.zeros((stride, joints, 3), dtype=np.float32)
+        self.valid = np.zeros(stride, dtype=bool)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def joints(self):
+        return self.rotation.shape[1]
+
+    def isFull(self):
+        return self.count >= self.stride
+
+    def setFrame(self, index: int, rotation, translation):
+        self.rotation[index] = rotation
+        self.translation[index] = translation
+        if not self.valid[index]:
+            self.valid[index] = True
+            self.count += 1
+
+    def setFrames(self, index: int, rotations, translations):
+        end = index + len(rotations)
+        self.rotation[index:end] = rotations
+        self.translation[index:end] = translations
+        self.valid[index:end] = True
+        self.count = int(np.count_nonzero(self.valid))
+
+    def setSample(self, index: int, sample: dict):
+        poses = sorted(sample["btrs"], key=lambda x: x["bnid"])
+        if len(poses) != self.joints():
+            raise ValueError(f"expected {self.joints()} joints, got {len(poses)}")
+        self.setFrame(
+            index,
+            [p["tran"]["rotation"] for p in poses],
+            [p["tran"]["translation"] for p in poses],
+        )
+
+    def indices(self):
+        return np.flatnonzero(self.valid)
+
+    def frames(self):
+        return self.base + self.indices()
+
+    def lastIndex(self):
+        return int(self.indices()[-1])
 
 
 class BaseWriter:
@@ -11,6 +68,8 @@ class BaseWriter:
         output_extension=".dummy",
         stride: int = 600,
         framesPerSecond=60,
+        clip_workers: int = None,
+        clip_queue: int = None,
         **kwargs,
     ):
         self._baseDir = Path(mainFileBasename)
@@ -22,11 +81,13 @@ class BaseWriter:
         self._fps = framesPerSecond
 
         self.skeleton_ = list()
-        self.timesamples_ = defaultdict(dict)
+        self.timesamples_ = dict()
         self.frameTimes_ = list()
         self.initialFrame_ = None
         self.lastFrame_ = -1
-        self._writeAnimationThreads = list()
+        self._clipPool = getClipWriterPool(clip_workers, clip_queue)
+        self._writeAnimationFutures = list()
+        self.onFlush = None
 
     def close(self):
         raise NotImplementedError("close OVERRIDE REQUIRED")
@@ -40,25 +101,60 @@ class BaseWriter:
             self.initialFrame_ = frame
         frame -= self.initialFrame_
         self.lastFrame_ = max(self.lastFrame_, frame)
-        self.timesamples_[(frame // self._stride) * self._stride][frame] = sample
         self.frameTimes_.append(sample["uttm"])
 
-        buckets = self.timesamples_.keys()
-        if self.skeleton_ is not None and len(self.timesamples_[min(buckets)]) >= self._stride:
-            fullBucket = min(buckets)
-            anims = self.timesamples_.pop(fullBucket)
-            self._writeAnimation(fullBucket, anims)
+        base = (frame // self._stride) * self._stride
+        chunk = self.timesamples_.get(base)
+        if chunk is None:
+            chunk = self._newChunk(base, len(sample["btrs"]))
+        chunk.setSample(frame - base, sample)
+
+        if self.skeleton_ is not None and chunk.isFull():
+            self._writeAnimation(base, self.timesamples_.pop(base))
+
+    def addTimesampleChunk(self, chunk: TimesampleChunk):
+        if self.initialFrame_ is None:
+            self.initialFrame_ = 0
+        self.lastFrame_ = max(self.lastFrame_, chunk.base + chunk.lastIndex())
+        if chunk.isFull():
+            self._writeAnimation(chunk.base, chunk)
+        else:
+            self.timesamples_[chunk.base] = chunk
+
+    def _newChunk(self, base: int, joints: int):
+        # chunks more than one stride behind will not receive late frames any more
+        for stale in [b for b in self.timesamples_ if b < base - self._stride]:
+            self._writeAnimation(stale, self.timesamples_.pop(stale))
+        chunk = TimesampleChunk(base, self._stride, joints)
+        self.timesamples_[base] = chunk
+        return chunk
 
     def flushTimesample(self):
-        for t in self.timesamples_.items():
-            self._writeAnimation(*t)
+        for base in sorted(self.timesamples_):
+            self._writeAnimation(base, self.timesamples_.pop(base))
 
-        for t in self._writeAnimationThreads:
-            t.join()
+        for f in self._writeAnimationFutures:
+            try:
+                f.result()
+            except Exception as e:
+                print(e)
+        self._writeAnimationFutures.clear()
 
     def _writeAnimation(self, base, samples):
         raise NotImplementedError("__writeAnimation OVERRIDE REQUIRED")
 
+    def _submitAnimation(self, fn, *args):
+        # returns the result when written inline, otherwise the pending future
+        started = time.perf_counter()
+        if self._clipPool is None:
+            result = fn(*args)
+        else:
+            result = self._clipPool.submit(fn, *args)
+            self._writeAnimationFutures.append(result)
+        if self.onFlush is not None:
+            self.onFlush(time.perf_counter() - started)
+        return result
+
     def _solveFPS(self):
         from statistics import fmean
 
@@ -77,4 +173,4 @@ class BaseWriter:
         self._fps = fps
 
 
-__all__ = ["BaseWriter"]
+__all__ = ["BaseWriter", "TimesampleChunk"]
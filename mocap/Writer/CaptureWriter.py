@@ -0,0 +1,44 @@
+from mocap.Reader.MocopiCapture import (
+    CAPTURE_MAGIC,
+    INDEX_MAGIC,
+    RECORD_HEADER,
+    INDEX_ENTRY,
+    indexPath,
+    packAddress,
+)
+from .BaseWriter import BaseWriter
+
+
+class CaptureWriter(BaseWriter):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs, output_extension=".smfcap")
+
+        self._mainFile.parent.absolute().mkdir(parents=True, exist_ok=True)
+
+        self._file = self._mainFile.open("wb")
+        self._file.write(CAPTURE_MAGIC)
+        self._index = indexPath(self._mainFile).open("wb")
+        self._index.write(INDEX_MAGIC)
+
+    def close(self):
+        self._file.close()
+        self._index.close()
+
+    def updateSkeleton(self, skeleton: list):
+        pass
+
+    def addTimesample(self, sample: dict):
+        pass
+
+    def flushTimesample(self):
+        self._file.flush()
+        self._index.flush()
+
+    def addPacket(self, recvTime: float, client_address, data: bytes):
+        offset = self._file.tell()
+        self._file.write(RECORD_HEADER.pack(recvTime, packAddress(client_address), client_address[1], len(data)))
+        self._file.write(data)
+        self._index.write(INDEX_ENTRY.pack(offset, recvTime))
+
+
+__all__ = ["CaptureWriter"]
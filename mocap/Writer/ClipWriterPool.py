@@ -0,0 +1,61 @@
+import atexit
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+_SHARED_POOL = None
+_SHARED_POOL_LOCK = threading.Lock()
+
+
+class ClipWriterPool:
+    def __init__(self, workers: int = None, maxPending: int = None):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if maxPending is None:
+            maxPending = workers * 2
+
+        self.workers = workers
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+        # submit() blocks once this many clips are queued or running
+        self._pending = threading.BoundedSemaphore(maxPending)
+
+    def submit(self, fn, *args):
+        self._pending.acquire()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._pending.release()
+            raise
+        future.add_done_callback(lambda _: self._pending.release())
+        return future
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+def getClipWriterPool(workers: int = None, maxPending: int = None):
+    # workers == 0 disables the pool, clips are then written on the calling thread
+    global _SHARED_POOL
+
+    if workers == 0:
+        return None
+
+    with _SHARED_POOL_LOCK:
+        if _SHARED_POOL is None:
+            _SHARED_POOL = ClipWriterPool(workers, maxPending)
+            atexit.register(_SHARED_POOL.shutdown)
+        return _SHARED_POOL
+
+
+def shutdownClipWriterPool():
+    # a multiprocessing child joins its own children before atexit runs, so it has to stop the pool itself
+    global _SHARED_POOL
+
+    with _SHARED_POOL_LOCK:
+        if _SHARED_POOL is not None:
+            atexit.unregister(_SHARED_POOL.shutdown)
+            _SHARED_POOL.shutdown()
+            _SHARED_POOL = None
+
+
+__all__ = ["ClipWriterPool", "getClipWriterPool", "shutdownClipWriterPool"]
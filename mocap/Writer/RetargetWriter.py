@@ -0,0 +1,114 @@
+import numpy as np
+
+from .quatMath import quatFromMatrix
+from .skelTree import jointName
+
+
+class RetargetWriter:
+    # retargets every frame onto a target character and hands it to another writer
+    def __init__(
+        self,
+        mainFileBasename: str,
+        *,
+        retarget_character=None,
+        retarget_skel_path: str = None,
+        retarget_writer: str = "usd",
+        retarget_scale: float = 1.0,
+        **kwargs,
+    ):
+        from retarget.Reader.USD import TargetCharacter
+
+        from mocap.udp.SMFReciever import WRITERS
+
+        if retarget_character is None:
+            raise ValueError("the retarget writer needs a target character")
+        if retarget_writer == "retarget":
+            raise ValueError("the retarget writer cannot wrap itself")
+
+        target = TargetCharacter(retarget_character, retarget_skel_path)
+        self._mapping = target._findMapping()
+        self._targetSkeleton = target.skeleton()
+        skel = self._targetSkeleton
+        self._restRotations = quatFromMatrix(np.swapaxes(skel.restTransforms, -1, -2)).astype(np.float32)
+        self._restTranslations = skel.restTransforms[:, 3, :3].astype(np.float32)
+        self._scale = retarget_scale
+
+        self._engine = None
+        self._bones = None
+        self._sourceCount = 0
+        self._writer = WRITERS[retarget_writer](mainFileBasename, **kwargs)
+        # the receiver looks addPacket up on the writer it holds, raw packets go to the inner writer untouched
+        if hasattr(self._writer, "addPacket"):
+            self.addPacket = self._writer.addPacket
+
+    @property
+    def onFlush(self):
+        return getattr(self._writer, "onFlush", None)
+
+    @onFlush.setter
+    def onFlush(self, callback):
+        if hasattr(self._writer, "onFlush"):
+            self._writer.onFlush = callback
+
+    def close(self):
+        self._writer.close()
+
+    def flushTimesample(self):
+        self._writer.flushTimesample()
+
+    def updateSkeleton(self, skeleton: list):
+        from retarget.Engine import RetargetEngine
+
+        poses = sorted(skeleton, key=lambda x: x["bnid"])
+        self._engine = RetargetEngine(
+            self._mapping,
+            [jointName(s["bnid"]) for s in poses],
+            targetSkeleton=self._targetSkeleton,
+            sourceRests=[s["tran"]["rotation"] for s in poses],
+            rootScale=self._scale,
+        )
+        self._sourceCount = len(poses)
+        rows = {p: i for i, p in enumerate(self._targetSkeleton.paths)}
+        self._targetRows = [rows[t] for t in self._engine.targets]
+        self._writer.updateSkeleton(self._targetBones())
+
+    def _targetBones(self):
+        # the whole target skeleton as an skdf bone list, with its own paths; joints the mapping leaves out stay at rest
+        skel = self._targetSkeleton
+        return [
+            {
+                "name": "bndt",
+                "bnid": row,
+                "pbid": int(skel.parents[row]) if skel.parents[row] >= 0 else 65535,
+                "joint": skel.names[row],
+                "tran": {
+                    "rotation": tuple(self._restRotations[row].tolist()),
+                    "translation": tuple(self._restTranslations[row].tolist()),
+                },
+            }
+            for row in range(len(skel))
+        ]
+
+    def addTimesample(self, sample: dict):
+        if self._engine is None:
+            return
+        poses = sorted(sample["btrs"], key=lambda x: x["bnid"])
+        if len(poses) != self._sourceCount:
+            raise ValueError(f"expected {self._sourceCount} joints, got {len(poses)}")
+
+        solvedRotations, solvedTranslations = self._engine.solve(
+            [p["tran"]["rotation"] for p in poses],
+            [p["tran"]["translation"] for p in poses],
+        )
+        rotations = self._restRotations.copy()
+        translations = self._restTranslations.copy()
+        rotations[self._targetRows] = solvedRotations
+        translations[self._targetRows] = solvedTranslations
+        btrs = [
+            {"name": "btdt", "bnid": i, "tran": {"rotation": r, "translation": t}}
+            for i, (r, t) in enumerate(zip(rotations.tolist(), translations.tolist()))
+        ]
+        self._writer.addTimesample(dict(sample, btrs=btrs))
+
+
+__all__ = ["RetargetWriter"]
@@ -0,0 +1,69 @@
+from pathlib import Path
+
+from mocap.Reader.SharedPoses import SHM_NAME, closePublisher, openPublisher
+
+
+class SharedMemoryWriter:
+    # publishes every frame into the shared pose ring, optionally recording it with another writer as well
+    def __init__(
+        self,
+        mainFileBasename: str,
+        *,
+        shm_name: str = SHM_NAME,
+        shm_slots: int = 256,
+        shm_joints: int = 32,
+        shm_writer: str = None,
+        **kwargs,
+    ):
+        from mocap.udp.SMFReciever import WRITERS
+
+        if shm_writer == "shm":
+            raise ValueError("the shm writer cannot wrap itself")
+
+        self._writer = WRITERS[shm_writer](mainFileBasename, **kwargs) if shm_writer is not None else None
+        # the receiver looks addPacket up on the writer it holds, raw packets go to the inner writer untouched
+        if hasattr(self._writer, "addPacket"):
+            self.addPacket = self._writer.addPacket
+        self._publisher = openPublisher(shm_name, shm_slots, shm_joints)
+        self._capacity = self._publisher.ring.joints()
+        self._client = self._publisher.register(Path(mainFileBasename).name)
+
+    @property
+    def onFlush(self):
+        return getattr(self._writer, "onFlush", None)
+
+    @onFlush.setter
+    def onFlush(self, callback):
+        if hasattr(self._writer, "onFlush"):
+            self._writer.onFlush = callback
+
+    def close(self):
+        self._publisher.unregister(self._client)
+        closePublisher(self._publisher)
+        if self._writer is not None:
+            self._writer.close()
+
+    def flushTimesample(self):
+        if self._writer is not None:
+            self._writer.flushTimesample()
+
+    def updateSkeleton(self, skeleton: list):
+        if len(skeleton) > self._capacity:
+            print(f"{len(skeleton)} joints do not fit the pose ring, only the first {self._capacity} are published")
+        if self._writer is not None:
+            self._writer.updateSkeleton(skeleton)
+
+    def addTimesample(self, sample: dict):
+        poses = sorted(sample["btrs"], key=lambda x: x["bnid"])[: self._capacity]
+        self._publisher.publish(
+            self._client,
+            sample["fnum"],
+            sample["uttm"],
+            [p["tran"]["rotation"] for p in poses],
+            [p["tran"]["translation"] for p in poses],
+        )
+        if self._writer is not None:
+            self._writer.addTimesample(sample)
+
+
+__all__ = ["SharedMemoryWriter"]
@@ -1,100 +1,62 @@
+import threading
+
 from pathlib import Path
 from collections import OrderedDict
-import multiprocessing
 
-from pxr import Gf, Usd, UsdSkel
-from .BaseWriter import BaseWriter
-from .skelTree import SkelNode
+import numpy as np
+from pxr import Gf, Sdf, Usd, UsdSkel, Vt
+from .BaseWriter import BaseWriter, TimesampleChunk
+from .keyReduction import reduceKeyframes
+from .skelTree import FlatSkeleton
+
+# the first Usd.Stage built in a process loads plugins, doing that from several writer threads at once deadlocks
+STAGE_LOCK = threading.Lock()
 
 
 class USDWriter(BaseWriter):
-    def __init__(self, *args, clipPattern="clip.#.usd", **kwargs):
+    def __init__(
+        self,
+        *args,
+        clipPattern="clip.#.usd",
+        clip_format="usdc",
+        key_tolerance_deg: float = None,
+        key_tolerance_mm: float = None,
+        metersPerUnit: float = 1.0,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs, output_extension=".usda")
 
         self._baseDir.absolute().mkdir(parents=True, exist_ok=True)
 
         self.pattern_ = self._baseDir / clipPattern
+        self._clipFormat = clip_format
+        # keyframe reduction is off unless one of the tolerances is given, the other one then means exact
+        self._keyTolerance = None
+        if key_tolerance_deg is not None or key_tolerance_mm is not None:
+            # mocopi streams meters, the converter passes the unit of its BVH
+            self._keyTolerance = (key_tolerance_deg or 0.0, key_tolerance_mm or 0.0, metersPerUnit)
 
         self.joints = list()
         self.jointNames = list()
         self.restTransForms = list()
 
     def updateSkeleton(self, skeleton: list):
-        skel = None
-        for s in sorted(skeleton, key=lambda x: x["bnid"]):
-            if skel is None:
-                skel = SkelNode(
-                    s["bnid"],
-                    s["tran"]["rotation"],
-                    s["tran"]["translation"],
-                    s["pbid"],
-                )
-                skel.global_to_self_transform = Gf.Matrix4d(
-                    1,
-                    0,
-                    0,
-                    0,  #
-                    0,
-                    1,
-                    0,
-                    0,  #
-                    0,
-                    0,
-                    1,
-                    0,  #
-                    skel.translation[0],
-                    skel.translation[1],
-                    skel.translation[1],
-                    1,
-                )
-            else:
-                skel.append(
-                    SkelNode(
-                        s["bnid"],
-                        s["tran"]["rotation"],
-                        s["tran"]["translation"],
-                        s["pbid"],
-                    )
-                )
-
-        joints = OrderedDict()
-
-        def BuildJoints(s):
-            joints[s.id] = s.fullPath()
-            for c in s.children:
-                BuildJoints(c)
-
-        BuildJoints(skel)
-
-        jointNames = OrderedDict()
-
-        def BuildJointNames(s):
-            jointNames[s.id] = s.name()
-            for c in s.children:
-                BuildJointNames(c)
-
-        BuildJointNames(skel)
-
-        restTransForms = OrderedDict()
-
-        def BuildRests(s):
-            restTransForms[s.id] = s.restTransform
-            for c in s.children:
-                BuildRests(c)
-
-        BuildRests(skel)
+        skel = FlatSkeleton.fromSkdf(skeleton)
+        order = skel.order.tolist()
+        ids = skel.ids[order].tolist()
 
         self.skeleton_ = skel
-        self.joints = joints
-        self.jointNames = jointNames
-        self.restTransForms = restTransForms
+        self.joints = OrderedDict(zip(ids, [skel.paths[i] for i in order]))
+        self.jointNames = OrderedDict(zip(ids, [skel.names[i] for i in order]))
+        self.restTransForms = OrderedDict(zip(ids, map(Gf.Matrix4d, skel.restTransforms[order].tolist())))
 
     def close(self):
         joints = self.joints
         restTransforms = self.restTransForms
         # generate manifest file
         manifestFile = self._baseDir / "manifest.usda"
-        generateManifest(manifestFile.as_posix())
+        with STAGE_LOCK:
+            generateManifest(manifestFile.as_posix())
 
         # flush valueclips file
         self.flushTimesample()
@@ -144,34 +106,27 @@ class USDWriter(BaseWriter):
 
     def flushTimesample(self):
         if len(self.timesamples_) > 0:
-            for base, v in self.timesamples_.items():
-                if len(v) < self._stride:
-                    max_1 = min(v.keys()) + self._stride - 1
-                    v[max_1] = v[max(v.keys())]
+            for chunk in self.timesamples_.values():
+                if not chunk.isFull():
+                    last = chunk.lastIndex()
+                    chunk.setFrame(self._stride - 1, chunk.rotation[last], chunk.translation[last])
 
-            last_base = max(self.timesamples_.keys())
-            last_pose_frame = max(self.timesamples_[last_base].keys())
-            lase_pose = self.timesamples_[last_base][last_pose_frame]
+            last_chunk = self.timesamples_[max(self.timesamples_.keys())]
+            last = last_chunk.lastIndex()
+            lase_pose = (last_chunk.rotation[last], last_chunk.translation[last])
 
-            self.timesamples_[last_base + self._stride][last_base + self._stride] = lase_pose
-            self.timesamples_[last_base + self._stride][last_base + (self._stride * 2) - 1] = lase_pose
+            tail = TimesampleChunk(last_chunk.base + self._stride, self._stride, last_chunk.joints())
+            tail.setFrame(0, *lase_pose)
+            tail.setFrame(self._stride - 1, *lase_pose)
+            self.timesamples_[tail.base] = tail
 
         super().flushTimesample()
 
     def _writeAnimation(self, base, samples):
         file = Path(self.pattern_.as_posix().replace("#", str(base)))
-        self._writeAnimationThreads.append(
-            multiprocessing.Process(
-                target=saveValueClip,
-                args=(
-                    file.as_posix(),
-                    self.joints,
-                    samples,
-                ),
-                name=file.name,
-            )
+        self._submitAnimation(
+            saveValueClip, file.as_posix(), self.joints, samples, self._clipFormat, self._keyTolerance
         )
-        self._writeAnimationThreads[-1].start()
 
 
 def generateManifest(file: str):
@@ -186,37 +141,36 @@ def generateManifest(file: str):
     layer.Export(file)
 
 
-def saveValueClip(file: str, joints: OrderedDict, timesamples: dict):
-    timecodes = timesamples.keys()
-
-    stage = Usd.Stage.CreateInMemory()
-    stage.SetStartTimeCode(min(timecodes))
-    stage.SetEndTimeCode(max(timecodes))
+def saveValueClip(
+    file: str, joints: OrderedDict, timesamples: TimesampleChunk, fileFormat: str = "usdc", keyTolerance=None
+):
+    order = list(joints.keys())
+    rotations = np.ascontiguousarray(timesamples.rotation[:, order])
+    translations = np.ascontiguousarray(timesamples.translation[:, order])
 
-    animPrim = UsdSkel.Animation.Define(stage, "/Motion")
-    stage.SetDefaultPrim(animPrim.GetPrim())
+    indices = timesamples.indices()
+    if keyTolerance is not None:
+        indices = indices[reduceKeyframes(indices, rotations[indices], translations[indices], *keyTolerance)]
+    timecodes = (timesamples.base + indices).tolist()
 
-    rotationsAttr = animPrim.CreateRotationsAttr()
-    translationsAttr = animPrim.CreateTranslationsAttr()
+    layer = Sdf.Layer.CreateAnonymous(".usd", args={"format": fileFormat})
+    with Sdf.ChangeBlock():
+        animPrim = Sdf.CreatePrimInLayer(layer, "/Motion")
+        animPrim.specifier = Sdf.SpecifierDef
+        animPrim.typeName = "SkelAnimation"
 
-    for time, poses in sorted(timesamples.items()):
-        ordered_poses = sorted(poses["btrs"], key=lambda x: x["bnid"])
-        rotation_series = list()
-        translation_series = list()
-        for id in joints:
-            pose = ordered_poses[id]
-            r = pose["tran"]["rotation"]
-            t = pose["tran"]["translation"]
+        rotationsAttr = Sdf.AttributeSpec(animPrim, "rotations", Sdf.ValueTypeNames.QuatfArray)
+        translationsAttr = Sdf.AttributeSpec(animPrim, "translations", Sdf.ValueTypeNames.Float3Array)
 
-            rotation_series.append(Gf.Quatf(r[3], r[0], r[1], r[2]))
-            translation_series.append(Gf.Vec3f(*t))
+        for time, i in zip(timecodes, indices):
+            layer.SetTimeSample(rotationsAttr.path, time, Vt.QuatfArray.FromNumpy(rotations[i]))
+            layer.SetTimeSample(translationsAttr.path, time, Vt.Vec3fArray.FromNumpy(translations[i]))
 
-        rotationsAttr.Set(rotation_series, time)
-        translationsAttr.Set(translation_series, time)
+        layer.defaultPrim = "Motion"
+        layer.startTimeCode = timecodes[0]
+        layer.endTimeCode = timecodes[-1]
 
-    layer = stage.GetEditTarget().GetLayer()
-    layer.TransferContent(stage.GetRootLayer())
-    layer.Export(file)
+    layer.Export(file, args={"format": fileFormat})
 
 
 __all__ = ["USDWriter"]
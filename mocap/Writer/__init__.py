@@ -1,9 +1,15 @@
 from .DebugWriter import DebugWriter
 from .BVHWriter import BVHWriter
 from .USDWriter import USDWriter
+from .CaptureWriter import CaptureWriter
+from .RetargetWriter import RetargetWriter
+from .SharedMemoryWriter import SharedMemoryWriter
 
 __all__ = [
     "DebugWriter",
     "BVHWriter",
     "USDWriter",
+    "CaptureWriter",
+    "RetargetWriter",
+    "SharedMemoryWriter",
 ]
@@ -0,0 +1,74 @@
+import numpy as np
+
+from .quatMath import quatSlerp
+
+
+class Tolerance:
+    # whether frames are within tolerance of the interpolation USD does between two other frames
+    def __init__(self, times, rotations, translations, degrees: float, millimeters: float, metersPerUnit: float):
+        self.times = np.asarray(times, dtype=np.float64)
+        self.rotations = np.asarray(rotations, dtype=np.float64)
+        self.translations = np.asarray(translations, dtype=np.float64)
+        # two unit quaternions are within an angle when |dot| >= cos(angle / 2)
+        self.minDot = np.cos(np.radians(degrees) * 0.5)
+        self.maxDistance = (millimeters * 0.001 / metersPerUnit) ** 2
+
+    def fits(self, frames, starts, ends):
+        # one bool per frame, every joint of it has to fit
+        t = (self.times[frames] - self.times[starts]) / (self.times[ends] - self.times[starts])
+        t = t[:, None]
+
+        a, b = self.translations[starts], self.translations[ends]
+        error = np.sum(np.square(a + (b - a) * t[..., None] - self.translations[frames]), axis=-1)
+        fits = np.all(error <= self.maxDistance, axis=-1)
+
+        rotations = quatSlerp(self.rotations[starts], self.rotations[ends], t)
+        dot = np.abs(np.sum(rotations * self.rotations[frames], axis=-1))
+        return fits & np.all(dot >= self.minDot, axis=-1)
+
+    def spanFits(self, start: int, end: int):
+        if end - start < 2:
+            return True
+        return bool(np.all(self.fits(np.arange(start + 1, end), start, end)))
+
+
+def reduceKeyframes(
+    times, rotations, translations, degrees: float = 0.0, millimeters: float = 0.0, metersPerUnit: float = 1.0
+):
+    # rotations [frames, joints, 4], translations [frames, joints, 3] in metersPerUnit; a frame is dropped only when
+    # every joint can be interpolated from the kept keys, since USD samples the whole joint array at once
+    count = len(times)
+    keep = np.zeros(count, dtype=bool)
+    if count == 0:
+        return keep
+    keep[[0, -1]] = True
+    if count < 3:
+        return keep
+
+    tolerance = Tolerance(times, rotations, translations, degrees, millimeters, metersPerUnit)
+    # a frame its own neighbours cannot reconstruct stays a key, keeping extra keys never breaks the tolerance
+    inner = np.arange(1, count - 1)
+    keep[inner] = ~tolerance.fits(inner, inner - 1, inner + 1)
+
+    keys = np.flatnonzero(keep).tolist()
+    for start, last in zip(keys[:-1], keys[1:]):
+        while last - start > 1:
+            # gallop to the first span that does not fit, then bisect for the longest one that does
+            good, bad, span = start + 1, last + 1, 2
+            while start + span <= last:
+                if not tolerance.spanFits(start, start + span):
+                    bad = start + span
+                    break
+                good, span = start + span, span * 2
+            while bad - good > 1:
+                middle = (good + bad) // 2
+                if tolerance.spanFits(start, middle):
+                    good = middle
+                else:
+                    bad = middle
+            keep[good] = True
+            start = good
+    return keep
+
+
+__all__ = ["reduceKeyframes"]
@@ -0,0 +1,124 @@
+import numpy as np
+
+# quaternions are stored as (x, y, z, w), the same order as mocopi tran and Gf.Quatf buffers
+
+
+def quatMultiply(a, b):
+    # Hamilton product a * b, which is Gf.Rotation(b) * Gf.Rotation(a)
+    a = np.asarray(a)
+    b = np.asarray(b)
+    ax, ay, az, aw = np.moveaxis(a, -1, 0)
+    bx, by, bz, bw = np.moveaxis(b, -1, 0)
+    return np.stack(
+        [
+            aw * bx + ax * bw + ay * bz - az * by,
+            aw * by - ax * bz + ay * bw + az * bx,
+            aw * bz + ax * by - ay * bx + az * bw,
+            aw * bw - ax * bx - ay * by - az * bz,
+        ],
+        axis=-1,
+    )
+
+
+def quatConjugate(q):
+    # the inverse of a unit quaternion
+    q = np.array(q, copy=True)
+    q[..., :3] *= -1
+    return q
+
+
+def quatSlerp(a, b, t):
+    # shortest path like GfSlerp, t broadcasts against the leading axes of a and b
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    t = np.asarray(t, dtype=np.float64)[..., None]
+    dot = np.sum(a * b, axis=-1, keepdims=True)
+    b = np.where(dot < 0, -b, b)
+    theta = np.arccos(np.clip(np.abs(dot), 0.0, 1.0))
+    sin = np.sin(theta)
+    # nearly equal rotations fall back to a plain lerp
+    linear = sin < 1e-6
+    sin = np.where(linear, 1.0, sin)
+    wa = np.where(linear, 1 - t, np.sin((1 - t) * theta) / sin)
+    wb = np.where(linear, t, np.sin(t * theta) / sin)
+    return wa * a + wb * b
+
+
+def quatFromAxisAngle(axis, degrees):
+    # axis is an index 0, 1, 2 for X, Y, Z, broadcast against degrees
+    half = np.radians(np.asarray(degrees, dtype=np.float64)) * 0.5
+    axis = np.broadcast_to(axis, half.shape)
+    q = np.zeros(half.shape + (4,))
+    s = np.sin(half)
+    for i in range(3):
+        q[..., i] = np.where(axis == i, s, 0.0)
+    q[..., 3] = np.cos(half)
+    return q
+
+
+def quatToMatrix(q):
+    q = np.asarray(q, dtype=np.float64)
+    x, y, z, w = np.moveaxis(q, -1, 0)
+    xx, yy, zz = x * x, y * y, z * z
+    xy, xz, yz = x * y, x * z, y * z
+    wx, wy, wz = w * x, w * y, w * z
+    n = xx + yy + zz + w * w
+    s = np.divide(2.0, n, out=np.zeros_like(n), where=n > 0)
+
+    m = np.empty(q.shape[:-1] + (3, 3))
+    m[..., 0, 0] = 1 - s * (yy + zz)
+    m[..., 0, 1] = s * (xy - wz)
+    m[..., 0, 2] = s * (xz + wy)
+    m[..., 1, 0] = s * (xy + wz)
+    m[..., 1, 1] = 1 - s * (xx + zz)
+    m[..., 1, 2] = s * (yz - wx)
+    m[..., 2, 0] = s * (xz - wy)
+    m[..., 2, 1] = s * (yz + wx)
+    m[..., 2, 2] = 1 - s * (xx + yy)
+    return m
+
+
+def quatFromMatrix(m):
+    # inverse of quatToMatrix, only the upper 3x3 of m is read; transpose Gf matrices first
+    m = np.asarray(m, dtype=np.float64)[..., :3, :3]
+    m00, m11, m22 = m[..., 0, 0], m[..., 1, 1], m[..., 2, 2]
+    q = np.empty(m.shape[:-2] + (4,))
+    q[..., 0] = np.copysign(np.sqrt(np.maximum(0.0, 1 + m00 - m11 - m22)) * 0.5, m[..., 2, 1] - m[..., 1, 2])
+    q[..., 1] = np.copysign(np.sqrt(np.maximum(0.0, 1 - m00 + m11 - m22)) * 0.5, m[..., 0, 2] - m[..., 2, 0])
+    q[..., 2] = np.copysign(np.sqrt(np.maximum(0.0, 1 - m00 - m11 + m22)) * 0.5, m[..., 1, 0] - m[..., 0, 1])
+    q[..., 3] = np.sqrt(np.maximum(0.0, 1 + m00 + m11 + m22)) * 0.5
+    return q
+
+
+def quatToEuler(q, axises, unwrap=False):
+    # degrees (a0, a1, a2) matching Gf.Rotation.Decompose(*axises),
+    # i.e. Gf.Rotation(axises[2], a2) * Gf.Rotation(axises[1], a1) * Gf.Rotation(axises[0], a0) == q
+    k, j, i = (int(np.argmax(np.abs(a))) for a in axises)
+    s = 1.0 if (i, j, k) in ((0, 1, 2), (1, 2, 0), (2, 0, 1)) else -1.0
+
+    m = quatToMatrix(q)
+    a = np.arctan2(s * m[..., k, j], m[..., k, k])
+    b = np.arcsin(np.clip(-s * m[..., k, i], -1.0, 1.0))
+    c = np.arctan2(s * m[..., j, i], m[..., i, i])
+
+    # gimbal lock, fold the first angle into the last one
+    locked = np.abs(m[..., k, i]) > 1 - 1e-9
+    if locked.any():
+        a = np.where(locked, 0.0, a)
+        c = np.where(locked, np.arctan2(-s * m[..., i, j], m[..., j, j]), c)
+
+    euler = np.degrees(np.stack([c, b, a], axis=-1))
+    if unwrap and len(euler) > 1:
+        euler = np.unwrap(euler, period=360, axis=0)
+    return euler
+
+
+__all__ = [
+    "quatMultiply",
+    "quatConjugate",
+    "quatSlerp",
+    "quatFromAxisAngle",
+    "quatToMatrix",
+    "quatFromMatrix",
+    "quatToEuler",
+]
@@ -1,3 +1,4 @@
+import numpy as np
 from pxr import Gf
 
 MOCOPI_SKEL_NAMES = {
@@ -31,6 +32,10 @@ MOCOPI_SKEL_NAMES = {
 }
 
 
+def jointName(id: int):
+    return MOCOPI_SKEL_NAMES.get(id, f"skel_{id}")
+
+
 class SkelNode:
     XYZ = (
         (
@@ -63,7 +68,7 @@ class SkelNode:
         self.translation = translation
         self.parent = int(parent)
         self.global_to_self_transform = Gf.Matrix4d(
-            1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 0, self.translation[0], self.translation[1], self.translation[1], 1
+            1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 0, self.translation[0], self.translation[1], self.translation[2], 1
         )
         self.restTransform = Gf.Matrix4d()
         self.children = list()
@@ -93,13 +98,113 @@ class SkelNode:
         return False
 
     def name(self):
-        if self.id in MOCOPI_SKEL_NAMES:
-            return MOCOPI_SKEL_NAMES[self.id]
-        return f"skel_{self.id}"
+        return jointName(self.id)
 
     def fullPath(self):
         parentPath = (self.__parentPath + "/") if len(self.__parentPath) > 0 else ""
         return parentPath + self.name()
 
 
-__all__ = ["SkelNode"]
+class FlatSkeleton:
+    # the whole skeleton as index arrays, built in one pass; joint i is the i-th joint handed to the constructor
+    __slots__ = (
+        "ids",
+        "parents",
+        "names",
+        "translations",
+        "rotations",
+        "children",
+        "order",
+        "depths",
+        "paths",
+        "restTransforms",
+        "indices",
+    )
+
+    def __init__(self, ids, parents, translations, rotations=None, names=None, restTransforms=None):
+        # parents are indices into ids, -1 marks a root
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.parents = np.asarray(parents, dtype=np.int64)
+        self.indices = {id: i for i, id in enumerate(self.ids.tolist())}
+        self.names = list(names) if names is not None else [jointName(id) for id in self.ids.tolist()]
+
+        count = len(self.ids)
+        self.translations = np.asarray(translations, dtype=np.float64).reshape(count, 3)
+        if rotations is None:
+            self.rotations = np.tile(np.array([0.0, 0.0, 0.0, 1.0]), (count, 1))
+        else:
+            self.rotations = np.asarray(rotations, dtype=np.float64).reshape(count, 4)
+
+        parentList = self.parents.tolist()
+        self.children = [list() for _ in range(count)]
+        roots = list()
+        for i, p in enumerate(parentList):
+            (roots if p < 0 else self.children[p]).append(i)
+
+        # depth first, children in the order they were given, which is the order SkelNode produced
+        order = list()
+        self.depths = [0] * count
+        self.paths = [None] * count
+        stack = roots[::-1]
+        while stack:
+            i = stack.pop()
+            p = parentList[i]
+            if p < 0:
+                self.paths[i] = self.names[i]
+            else:
+                self.depths[i] = self.depths[p] + 1
+                self.paths[i] = self.paths[p] + "/" + self.names[i]
+            order.append(i)
+            stack.extend(reversed(self.children[i]))
+        self.order = np.array(order, dtype=np.int64)
+
+        if restTransforms is None:
+            # rest is the local offset, in Gf row-vector layout; roots rest at the origin like SkelNode did
+            restTransforms = np.tile(np.identity(4), (count, 1, 1))
+            restTransforms[:, 3, :3] = self.translations
+            restTransforms[self.parents < 0] = np.identity(4)
+        self.restTransforms = np.asarray(restTransforms, dtype=np.float64).reshape(count, 4, 4)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def isRoot(self, index: int):
+        return self.parents[index] < 0
+
+    @classmethod
+    def fromSkdf(cls, skeleton: list):
+        # bones may carry a "joint" name, e.g. a retargeted rig, otherwise the mocopi name of the bnid is used
+        poses = sorted(skeleton, key=lambda x: x["bnid"])
+        ids = [s["bnid"] for s in poses]
+        indices = {id: i for i, id in enumerate(ids)}
+        return cls(
+            ids,
+            [indices.get(s["pbid"], -1) for s in poses],
+            [s["tran"]["translation"] for s in poses],
+            [s["tran"]["rotation"] for s in poses],
+            names=[s.get("joint") or jointName(s["bnid"]) for s in poses],
+        )
+
+    @classmethod
+    def fromJointPaths(cls, paths, restTransforms=None):
+        # UsdSkel joint tokens, the parent of a joint is its path prefix
+        paths = [str(p) for p in paths]
+        indices = {p: i for i, p in enumerate(paths)}
+        parents = [indices.get(p.rpartition("/")[0], -1) for p in paths]
+        translations = np.zeros((len(paths), 3))
+        if restTransforms is not None:
+            restTransforms = np.asarray(restTransforms, dtype=np.float64).reshape(len(paths), 4, 4)
+            translations = restTransforms[:, 3, :3]
+        skel = cls(
+            range(len(paths)),
+            parents,
+            translations,
+            names=[p.rpartition("/")[2] for p in paths],
+            restTransforms=restTransforms,
+        )
+        # keep the tokens as they were authored, even when a parent joint is missing
+        skel.paths = paths
+        return skel
+
+
+__all__ = ["SkelNode", "FlatSkeleton", "jointName"]
@@ -1,8 +1,39 @@
+def checkQueuePolicy(args):
+    if args.queue_policy == "block" and args.server == "asyncio":
+        # asyncio puts on the event loop thread, one stalled writer would stop reception for every suit
+        print("--queue-policy block needs --server threaded")
+        return False
+    return True
+
+
 def run_udp(args):
-    from mocap.udp import SMFReciever
+    from mocap.udp import Metrics, SMFReciever
+
+    if not checkQueuePolicy(args):
+        return
+
+    if args.processes > 1:
+        from mocap.udp import Shards
+
+        Shards.superviseShards(args.processes, args.server, ("0.0.0.0", args.listen_port), vars(args))
+        return
 
     SMFReciever.WRITER_OF_CHOICE = args.writer
     SMFReciever.WRITER_OPTIONS = dict(**vars(args))
+    SMFReciever.QUEUE_SIZE = args.queue_size
+    SMFReciever.QUEUE_POLICY = args.queue_policy
+    if args.relay is not None:
+        from mocap.udp.Relay import Relay
+
+        SMFReciever.RELAY = Relay(args.relay, args.relay_ttl, args.relay_interface)
+    Metrics.startMetrics(args.metrics_port, args.stats_interval)
+
+    if args.server == "asyncio":
+        try:
+            SMFReciever.serveAsyncio(("0.0.0.0", args.listen_port))
+        except KeyboardInterrupt:
+            pass
+        return
 
     with SMFReciever.ThreadedUDPServer(("0.0.0.0", args.listen_port), SMFReciever.ThreadedUDPHandler) as server:
         try:
@@ -16,20 +47,120 @@ def run_udp(args):
             threading.Thread(target=kill_me_please, args=(server,))
 
 
+def run_replay(args):
+    from mocap.Reader.MocopiCapture import CaptureReader
+    from mocap.udp import Replay, SMFReciever
+
+    capture = CaptureReader(args.input)
+
+    if args.target is not None:
+        host, port = args.target.rsplit(":", 1)
+        Replay.replayToSocket(capture, (host, int(port)), args.speed)
+        return
+
+    SMFReciever.WRITER_OF_CHOICE = args.writer
+    SMFReciever.WRITER_OPTIONS = dict(**vars(args))
+    SMFReciever.QUEUE_SIZE = args.queue_size
+    SMFReciever.QUEUE_POLICY = args.queue_policy
+    Replay.replayToWriters(capture, args.speed)
+
+
+def run_bench(args):
+    import sys
+
+    from mocap.bench import Micro
+
+    results = Micro.runBenchmarks(args.filter, args.packets, args.frames, args.repeat)
+    if args.save is not None:
+        Micro.saveResults(args.save, results)
+    if args.compare is not None and len(Micro.compareResults(args.compare, results, args.threshold)) > 0:
+        sys.exit(1)
+
+
+def run_loadtest(args):
+    from mocap.bench import LoadTest
+    from mocap.udp import Metrics, SMFReciever
+
+    if not checkQueuePolicy(args):
+        return
+
+    SMFReciever.WRITER_OF_CHOICE = args.writer
+    SMFReciever.WRITER_OPTIONS = dict(**vars(args))
+    SMFReciever.QUEUE_SIZE = args.queue_size
+    SMFReciever.QUEUE_POLICY = args.queue_policy
+    stopMetrics = Metrics.startMetrics(args.metrics_port, args.stats_interval)
+
+    result = LoadTest.runLoadTest(
+        args.senders,
+        args.rate,
+        args.duration,
+        server=args.server,
+        listen_port=args.listen_port,
+        skdfInterval=args.skdf_interval,
+    )
+    stopMetrics()
+    LoadTest.printReport(result)
+
+
 def run_convert(args):
     from mocap.Reader.BVHFile import composeFromBVH
 
     # if args.output_base is None:
     #     args.output_base = args.input.with_suffix("")
 
-    composeFromBVH(args.input, args.output_base, args.stride)
+    composeFromBVH(
+        args.input,
+        args.output_base,
+        args.stride,
+        args.jobs,
+        dict(key_tolerance_deg=args.key_tolerance_deg, key_tolerance_mm=args.key_tolerance_mm),
+        args.bvh_units,
+    )
+
+
+def addKeyReductionArguments(parser):
+    parser.add_argument(
+        "--key-tolerance-deg", type=float, metavar="DEG", default=None, help="drop keys within this rotation error"
+    )
+    parser.add_argument(
+        "--key-tolerance-mm", type=float, metavar="MM", default=None, help="drop keys within this translation error"
+    )
+
+
+def addWriterArguments(parser):
+    # every subcommand that feeds SMFReciever writers takes the same writer options, they end up in WRITER_OPTIONS
+    from pathlib import Path
+
+    from mocap.udp import SMFReciever
+    from mocap.Writer.BVHWriter import BVH_MODES
+
+    parser.add_argument("--writer", choices=SMFReciever.WRITERS.keys(), default="usd")
+    parser.add_argument("-o", "--output-base", type=Path, metavar="OUTPUT", default=None)
+    parser.add_argument("--stride", type=int, metavar="STRIDE", default=600)
+    parser.add_argument("--clip-workers", type=int, metavar="N", default=None, help="0 writes clips inline")
+    parser.add_argument("--clip-queue", type=int, metavar="N", default=None)
+    parser.add_argument("--clip-format", choices=["usdc", "usda"], default="usdc")
+    addKeyReductionArguments(parser)
+    parser.add_argument("--bvh-mode", choices=BVH_MODES, default="stream", help="merge writes chunks via temp files")
+    parser.add_argument("--retarget-character", type=Path, metavar="USD", default=None)
+    parser.add_argument("--retarget-skel-path", type=str, default=None)
+    parser.add_argument("--retarget-writer", choices=SMFReciever.WRITERS.keys(), default="usd")
+    parser.add_argument("--retarget-scale", type=float, default=1.0, help="root translation scale")
+    parser.add_argument("--shm-name", type=str, default="smf_poses", help="shared memory segment of the shm writer")
+    parser.add_argument("--shm-slots", type=int, default=256, help="frames kept in the pose ring")
+    parser.add_argument("--shm-joints", type=int, default=32, help="joints per pose ring record")
+    parser.add_argument(
+        "--shm-writer", choices=SMFReciever.WRITERS.keys(), default=None, help="also record with this writer"
+    )
+    parser.add_argument("--queue-size", type=int, metavar="N", default=3000, help="per-client backlog, 0 is unbounded")
 
 
 if __name__ == "__main__":
     import argparse
     from pathlib import Path
 
-    from mocap.udp import SMFReciever
+    from mocap.Reader.BVHFile import BVH_UNITS
+    from mocap.udp.ClientQueue import QUEUE_POLICIES
 
     parser = argparse.ArgumentParser()
     parser.set_defaults(func=lambda x: parser.print_help())
@@ -37,16 +168,64 @@ if __name__ == "__main__":
 
     udp = subparsers.add_parser("udp")
     udp.add_argument("--listen-port", type=int, default=12351)
-    udp.add_argument("--writer", choices=SMFReciever.WRITERS.keys(), default="usd")
-    udp.add_argument("-o", "--output-base", type=Path, metavar="OUTPUT", default=None)
-    udp.add_argument("--stride", type=int, metavar="STRIDE", default=600)
+    addWriterArguments(udp)
+    udp.add_argument("--server", choices=["asyncio", "threaded"], default="asyncio")
+    udp.add_argument("--processes", type=int, metavar="N", default=1, help="receiver processes sharing the port")
+    udp.add_argument("--metrics-port", type=int, metavar="PORT", default=None, help="serve Prometheus metrics")
+    udp.add_argument("--stats-interval", type=float, metavar="SECONDS", default=10, help="0 disables the stats line")
+    udp.add_argument(
+        "--queue-policy", choices=QUEUE_POLICIES, default="drop-oldest", help="block needs --server threaded"
+    )
+    udp.add_argument(
+        "--relay", action="append", metavar="HOST:PORT", default=None, help="forward raw datagrams, repeatable"
+    )
+    udp.add_argument("--relay-ttl", type=int, default=1, help="hop limit for multicast relay targets")
+    udp.add_argument("--relay-interface", metavar="ADDRESS", default=None, help="local address multicast leaves from")
     udp.set_defaults(func=run_udp)
 
+    replay = subparsers.add_parser("replay")
+    replay.add_argument("input", type=Path)
+    replay.add_argument("--speed", type=float, default=1.0, help="playback rate, 0 replays as fast as possible")
+    replay.add_argument("--target", type=str, metavar="HOST:PORT", default=None)
+    addWriterArguments(replay)
+    replay.add_argument("--queue-policy", choices=QUEUE_POLICIES, default="block")
+    replay.set_defaults(func=run_replay)
+
     convert = subparsers.add_parser("convert")
     convert.add_argument("input", type=Path)
     convert.add_argument("-o", "--output-base", type=Path, metavar="OUTPUT", default=None)
     convert.add_argument("--stride", type=int, metavar="STRIDE", default=6000)
+    convert.add_argument("-j", "--jobs", type=int, metavar="N", default=None, help="defaults to the CPU count")
+    addKeyReductionArguments(convert)
+    convert.add_argument("--bvh-units", choices=BVH_UNITS.keys(), default="cm", help="length unit of the input")
     convert.set_defaults(func=run_convert)
 
+    bench = subparsers.add_parser("bench")
+    bench.add_argument("filter", nargs="*", help="run only benchmarks whose name contains one of these")
+    bench.add_argument("--packets", type=int, default=3000)
+    bench.add_argument("--frames", type=int, default=3000)
+    bench.add_argument("--repeat", type=int, default=5)
+    bench.add_argument("--save", type=Path, metavar="JSON", default=None)
+    bench.add_argument("--compare", type=Path, metavar="JSON", default=None)
+    bench.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown before failing")
+    bench.set_defaults(func=run_bench)
+
+    loadtest = subparsers.add_parser("loadtest")
+    loadtest.add_argument("--senders", type=int, default=4)
+    loadtest.add_argument("--rate", type=float, default=50, help="frames per second per sender")
+    loadtest.add_argument("--duration", type=float, default=10, help="seconds")
+    loadtest.add_argument("--skdf-interval", type=int, default=50, help="send a skeleton every N frames")
+    loadtest.add_argument("--listen-port", type=int, default=12351)
+    loadtest.add_argument("--server", choices=["asyncio", "threaded"], default="asyncio")
+    addWriterArguments(loadtest)
+    loadtest.add_argument("--metrics-port", type=int, metavar="PORT", default=None, help="serve Prometheus metrics")
+    loadtest.add_argument(
+        "--stats-interval", type=float, metavar="SECONDS", default=0, help="0 disables the stats line"
+    )
+    loadtest.add_argument(
+        "--queue-policy", choices=QUEUE_POLICIES, default="drop-oldest", help="block needs --server threaded"
+    )
+    loadtest.set_defaults(func=run_loadtest)
+
     args = parser.parse_args()
     args.func(args)
@@ -0,0 +1,139 @@
+import socket
+import struct
+import threading
+import time
+
+from mocap.udp import SMFReciever
+
+from .Synthetic import framPacket, skdfPacket
+
+
+class SyntheticSender:
+    # a single simulated suit, bound to its own loopback port
+    CYCLE = 500
+
+    def __init__(self, target_address, joints: int, skdfInterval: int):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("127.0.0.1", 0))
+        self.address = self.socket.getsockname()
+        self.target = target_address
+        self.skdfInterval = skdfInterval
+        self.sent = 0
+
+        self._skdf = skdfPacket(joints)
+        self._frames = [bytearray(framPacket(f, joints)) for f in range(self.CYCLE)]
+        self._fnumOffset = self._frames[0].index(b"fnum") + 4
+
+    def send(self, fnum: int):
+        if fnum % self.skdfInterval == 0:
+            self.socket.sendto(self._skdf, self.target)
+        packet = self._frames[fnum % self.CYCLE]
+        struct.pack_into("<I", packet, self._fnumOffset, fnum)
+        self.socket.sendto(packet, self.target)
+        self.sent += 1
+
+    def close(self):
+        self.socket.close()
+
+
+def startServer(server: str, server_address):
+    stop = threading.Event()
+    if server == "asyncio":
+        thread = threading.Thread(target=SMFReciever.serveAsyncio, args=(server_address, stop), daemon=True)
+        thread.start()
+        return lambda: (stop.set(), thread.join())
+
+    udp = SMFReciever.ThreadedUDPServer(server_address, SMFReciever.ThreadedUDPHandler)
+    thread = threading.Thread(target=udp.serve_forever, daemon=True)
+    thread.start()
+    return lambda: (udp.shutdown(), udp.server_close(), thread.join())
+
+
+def runLoadTest(
+    senders: int,
+    rate: float,
+    duration: float,
+    *,
+    server: str = "asyncio",
+    listen_port: int = 12351,
+    joints: int = 27,
+    skdfInterval: int = 50,
+):
+    SMFReciever.CLIENT_STATS.clear()
+    stopServer = startServer(server, ("127.0.0.1", listen_port))
+    time.sleep(0.2)
+
+    suits = [SyntheticSender(("127.0.0.1", listen_port), joints, skdfInterval) for _ in range(senders)]
+    started = time.perf_counter()
+    fnum = 0
+    try:
+        while time.perf_counter() - started < duration:
+            for s in suits:
+                s.send(fnum)
+            fnum += 1
+            wait = started + fnum / rate - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+    except KeyboardInterrupt:
+        pass
+    elapsed = time.perf_counter() - started
+
+    # let the writers drain what is already queued, lost frames never arrive so stop once progress does
+    drain = time.perf_counter()
+    written = -1
+    while time.perf_counter() - drain < 30:
+        progress = sum(SMFReciever.CLIENT_STATS.get(s.address, SMFReciever.ClientStats()).frames for s in suits)
+        if progress == written or progress >= sum(s.sent for s in suits):
+            break
+        written = progress
+        time.sleep(0.5)
+    drained = time.perf_counter() - drain
+
+    stopServer()
+
+    report = list()
+    for s in suits:
+        stats = SMFReciever.CLIENT_STATS.get(s.address, SMFReciever.ClientStats())
+        report.append(
+            {
+                "client": "{}:{}".format(*s.address),
+                "sent": s.sent,
+                "written": stats.frames,
+                "lost": stats.lost + max(0, s.sent - 1 - (stats.lastFnum if stats.lastFnum is not None else -1)),
+                "dropped": stats.dropped,
+                "reordered": stats.reordered,
+                "queue_high_water": stats.queueHighWater,
+                "lag_mean_ms": stats.lagMean() * 1000,
+                "lag_max_ms": stats.lagMax * 1000,
+            }
+        )
+        s.close()
+
+    return {
+        "elapsed": elapsed,
+        "drain": drained,
+        "offered_rate": sum(s.sent for s in suits) / elapsed,
+        "sustained_rate": sum(r["written"] for r in report) / (elapsed + drained),
+        "clients": report,
+    }
+
+
+def printReport(result: dict):
+    print(
+        "offered {:.0f} frames/s, sustained {:.0f} frames/s over {:.1f}s (+{:.1f}s drain)".format(
+            result["offered_rate"], result["sustained_rate"], result["elapsed"], result["drain"]
+        )
+    )
+    print(
+        "{:<22} {:>8} {:>8} {:>6} {:>8} {:>9} {:>10} {:>10} {:>10}".format(
+            "client", "sent", "written", "lost", "dropped", "reordered", "queue max", "lag ms", "lag max ms"
+        )
+    )
+    for r in result["clients"]:
+        print(
+            "{client:<22} {sent:>8} {written:>8} {lost:>6} {dropped:>8} {reordered:>9} {queue_high_water:>10} "
+            "{lag_mean_ms:>10.2f} {lag_max_ms:>10.2f}".format(**r)
+        )
+
+
+__all__ = ["SyntheticSender", "runLoadTest", "printReport"]
@@ -0,0 +1,161 @@
+import json
+import platform
+import tempfile
+import time
+import tracemalloc
+from collections import OrderedDict
+from pathlib import Path
+
+from mocap.Reader.BVHParser import parseBVH
+from mocap.Reader.MocopiUDP import MocopiPacket, decomposeMotionPackets, decomposePacket
+from mocap.Writer.BaseWriter import TimesampleChunk
+from mocap.Writer.BVHWriter import saveAnimationFragment
+from mocap.Writer.keyReduction import reduceKeyframes
+from mocap.Writer.skelTree import SkelNode
+from mocap.Writer.USDWriter import USDWriter, saveValueClip
+
+from .Synthetic import framPacket, skdfPacket, synthBVH
+
+
+def motionChunk(frames: int):
+    batch = decomposeMotionPackets([framPacket(f) for f in range(frames)])
+    chunk = TimesampleChunk(0, frames, batch["rotation"].shape[1])
+    chunk.setFrames(0, batch["rotation"], batch["translation"])
+    return chunk
+
+
+def setupDecode(workdir: Path, packets: int, frames: int):
+    data = [framPacket(f) for f in range(packets)]
+    return lambda: [decomposePacket(p) for p in data], packets, "packets/s"
+
+
+def setupDecodeRecursive(workdir: Path, packets: int, frames: int):
+    data = [framPacket(f) for f in range(packets)]
+    return lambda: [MocopiPacket(p).getData() for p in data], packets, "packets/s"
+
+
+def setupDecodeBatch(workdir: Path, packets: int, frames: int):
+    data = [framPacket(f) for f in range(packets)]
+    return lambda: decomposeMotionPackets(data), packets, "packets/s"
+
+
+def setupUpdateSkeleton(workdir: Path, packets: int, frames: int):
+    skeleton = decomposePacket(skdfPacket())["skdf"]["btrs"]
+    writer = USDWriter("skeleton", output_base=workdir, clip_workers=0)
+    return lambda: writer.updateSkeleton(skeleton), 1, "skeletons/s"
+
+
+def setupSaveValueClip(workdir: Path, packets: int, frames: int):
+    writer = USDWriter("clip", output_base=workdir, clip_workers=0)
+    writer.updateSkeleton(decomposePacket(skdfPacket())["skdf"]["btrs"])
+    chunk = motionChunk(frames)
+    file = (workdir / "clip.usd").as_posix()
+    return lambda: saveValueClip(file, writer.joints, chunk), frames, "frames/s"
+
+
+def setupReduceKeyframes(workdir: Path, packets: int, frames: int):
+    chunk = motionChunk(frames)
+    return lambda: reduceKeyframes(chunk.frames(), chunk.rotation, chunk.translation, 0.5, 1.0), frames, "frames/s"
+
+
+def setupSaveAnimationFragment(workdir: Path, packets: int, frames: int):
+    chunk = motionChunk(frames)
+    file = (workdir / "fragment.bvh").as_posix()
+    return lambda: saveAnimationFragment(file, 0, chunk, SkelNode.ZXY), frames, "frames/s"
+
+
+def setupParseBVH(workdir: Path, packets: int, frames: int):
+    text = synthBVH(frames)
+    return lambda: parseBVH(text), frames, "frames/s"
+
+
+def setupBVHLocalTransforms(workdir: Path, packets: int, frames: int):
+    bvh = parseBVH(synthBVH(frames))
+    return lambda: bvh.localTransforms(), frames, "frames/s"
+
+
+BENCHMARKS = OrderedDict(
+    [
+        ("decomposePacket", setupDecode),
+        ("decomposePacket.recursive", setupDecodeRecursive),
+        ("decomposeMotionPackets", setupDecodeBatch),
+        ("USDWriter.updateSkeleton", setupUpdateSkeleton),
+        ("saveValueClip", setupSaveValueClip),
+        ("reduceKeyframes", setupReduceKeyframes),
+        ("saveAnimationFragment", setupSaveAnimationFragment),
+        ("parseBVH", setupParseBVH),
+        ("BVHData.localTransforms", setupBVHLocalTransforms),
+    ]
+)
+
+
+def measure(fn, units: int, unit: str, repeat: int):
+    fn()  # warm up
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    # Python and NumPy heap only, allocations inside USD are not traced
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "seconds": best,
+        "rate": units / best,
+        "unit": unit,
+        "peak_bytes": peak,
+    }
+
+
+def runBenchmarks(names=None, packets: int = 3000, frames: int = 3000, repeat: int = 5):
+    results = OrderedDict()
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, setup in BENCHMARKS.items():
+            if names and not any(n in name for n in names):
+                continue
+            fn, units, unit = setup(Path(workdir), packets, frames)
+            results[name] = measure(fn, units, unit, repeat)
+            print(
+                "{:<28} {:>14,.0f} {:<12} {:>10.2f} MiB".format(
+                    name, results[name]["rate"], unit, results[name]["peak_bytes"] / (1 << 20)
+                )
+            )
+    return results
+
+
+def saveResults(file: Path, results: dict):
+    with Path(file).open("w") as f:
+        json.dump(
+            {
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+
+
+def compareResults(baselineFile: Path, results: dict, threshold: float = 0.1) -> list:
+    with Path(baselineFile).open() as f:
+        baseline = json.load(f)["results"]
+
+    regressions = list()
+    for name, r in results.items():
+        if name not in baseline:
+            continue
+        ratio = r["rate"] / baseline[name]["rate"]
+        flag = ""
+        if ratio < 1 - threshold:
+            flag = "REGRESSION"
+            regressions.append(name)
+        print("{:<28} {:>7.2f}x baseline {}".format(name, ratio, flag))
+    return regressions
+
+
+__all__ = ["BENCHMARKS", "runBenchmarks", "saveResults", "compareResults"]
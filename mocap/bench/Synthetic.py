@@ -0,0 +1,127 @@
+import math
+import struct
+
+from mocap.Writer.skelTree import MOCOPI_SKEL_NAMES
+
+MOCOPI_PARENTS = [
+    65535,
+    0,
+    1,
+    2,
+    3,
+    4,
+    5,
+    6,
+    7,
+    8,
+    9,
+    7,
+    11,
+    12,
+    13,
+    7,
+    15,
+    16,
+    17,
+    0,
+    19,
+    20,
+    21,
+    0,
+    23,
+    24,
+    25,
+]
+
+FIELD_HEADER = struct.Struct("<L4s")
+TRAN = struct.Struct("<7f")
+
+
+def packField(name: bytes, payload: bytes) -> bytes:
+    return FIELD_HEADER.pack(len(payload), name) + payload
+
+
+def packHeader(port: int = 12351) -> bytes:
+    head = packField(b"head", packField(b"ftyp", b"sony motion format") + packField(b"vrsn", struct.pack("b", 1)))
+    sndf = packField(
+        b"sndf", packField(b"ipad", struct.pack("II", 0, 0)) + packField(b"rcvp", struct.pack("<H", port))
+    )
+    return head + sndf
+
+
+def jointPose(joint: int, frame: int):
+    # smooth, unit-length rotation about a per-joint axis
+    angle = 0.5 * math.sin(frame * 0.05 + joint)
+    ax, ay, az = math.sin(joint), math.cos(joint), 0.5
+    n = math.sqrt(ax * ax + ay * ay + az * az)
+    s = math.sin(angle) / n
+    rotation = (ax * s, ay * s, az * s, math.cos(angle))
+    translation = (0.01 * math.sin(frame * 0.01), 0.9 if joint == 0 else 0.1, 0.01 * math.cos(frame * 0.01))
+    return rotation, translation
+
+
+def skdfPacket(joints: int = len(MOCOPI_PARENTS), port: int = 12351) -> bytes:
+    bones = b""
+    for j in range(joints):
+        _, translation = jointPose(j, 0)
+        bones += packField(
+            b"bndt",
+            packField(b"bnid", struct.pack("<H", j))
+            + packField(b"pbid", struct.pack("<H", MOCOPI_PARENTS[j] if j < len(MOCOPI_PARENTS) else j - 1))
+            + packField(b"tran", TRAN.pack(0, 0, 0, 1, *translation)),
+        )
+    return packHeader(port) + packField(b"skdf", packField(b"bons", bones))
+
+
+def framPacket(fnum: int, joints: int = len(MOCOPI_PARENTS), port: int = 12351, fps: int = 50) -> bytes:
+    bones = b""
+    for j in range(joints):
+        rotation, translation = jointPose(j, fnum)
+        bones += packField(
+            b"btdt",
+            packField(b"bnid", struct.pack("<H", j)) + packField(b"tran", TRAN.pack(*rotation, *translation)),
+        )
+    fram = (
+        packField(b"fnum", struct.pack("<I", fnum))
+        + packField(b"time", struct.pack("<f", fnum / fps))
+        + packField(b"uttm", struct.pack("<d", 1.7e9 + fnum / fps))
+        + packField(b"btrs", bones)
+    )
+    return packHeader(port) + packField(b"fram", fram)
+
+
+def synthBVH(frames: int, joints: int = len(MOCOPI_PARENTS), fps: int = 50) -> str:
+    parents = [MOCOPI_PARENTS[j] if j < len(MOCOPI_PARENTS) else j - 1 for j in range(joints)]
+    children = {j: [c for c in range(joints) if parents[c] == j] for j in range(joints)}
+    lines = ["HIERARCHY"]
+
+    def dump(j, indent):
+        prefix = "  " * indent
+        name = MOCOPI_SKEL_NAMES.get(j, f"skel_{j}")
+        lines.append(prefix + ("ROOT " if indent == 0 else "JOINT ") + name)
+        lines.append(prefix + "{")
+        lines.append(prefix + "  OFFSET 0 {} 0".format(90 if indent == 0 else 10))
+        lines.append(prefix + "  CHANNELS 6 Xposition Yposition Zposition Zrotation Xrotation Yrotation")
+        for c in children[j]:
+            dump(c, indent + 1)
+        if len(children[j]) == 0:
+            lines.append(prefix + "  End Site")
+            lines.append(prefix + "  {")
+            lines.append(prefix + "    OFFSET 0 0 0")
+            lines.append(prefix + "  }")
+        lines.append(prefix + "}")
+
+    dump(0, 0)
+    lines.append("MOTION")
+    lines.append(f"Frames: {frames}")
+    lines.append(f"Frame Time: {1.0 / fps}")
+    for f in range(frames):
+        row = list()
+        for j in range(joints):
+            row += [0, 90 if j == 0 else 10, 0]
+            row += [round(30 * math.sin(f * 0.05 + j + k), 5) for k in range(3)]
+        lines.append(" ".join(map(str, row)))
+    return "\n".join(lines) + "\n"
+
+
+__all__ = ["packField", "packHeader", "skdfPacket", "framPacket", "synthBVH"]
@@ -0,0 +1,82 @@
+import queue
+
+from collections import deque
+
+QUEUE_POLICIES = ["drop-oldest", "drop-newest", "decimate", "block"]
+
+
+def isPriority(item: dict):
+    # skeletons and stop tokens are never dropped, a writer without its skeleton is useless
+    return "skdf" in item or "STOP_TOKEN" in item
+
+
+class ClientQueue(queue.Queue):
+    def __init__(self, maxsize: int = 0, policy: str = "drop-oldest"):
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"unknown queue policy {policy}")
+        # block is plain queue.Queue backpressure, the other policies never make put() wait
+        super().__init__(maxsize if policy == "block" else 0)
+        self.bound = maxsize
+        self.policy = policy
+        self.dropped = 0
+        # decimate keeps one in every stride incoming frames, the stride doubles each time the backlog is halved
+        self._stride = 1
+        self._skip = 0
+
+    def _init(self, maxsize):
+        self.queue = deque()
+
+    def _put(self, item):
+        if self.policy == "decimate" and not isPriority(item):
+            self._decimate(item)
+            return
+        if self.policy != "block" and 0 < self.bound <= len(self.queue):
+            if self.policy == "drop-newest" and not isPriority(item):
+                self._drop(1)
+                return
+            self._dropOldest()
+        self.queue.append(item)
+
+    def _drop(self, n: int):
+        # put() counts every item as an unfinished task, including the ones that never reach the worker
+        self.dropped += n
+        self.unfinished_tasks -= n
+
+    def _dropOldest(self):
+        for i, item in enumerate(self.queue):
+            if not isPriority(item):
+                del self.queue[i]
+                self._drop(1)
+                return
+
+    def _get(self):
+        item = self.queue.popleft()
+        if len(self.queue) == 0:
+            # the worker caught up, back to full rate
+            self._stride = 1
+            self._skip = 0
+        return item
+
+    def _decimate(self, item):
+        # the backlog always holds evenly spaced frames, so the take keeps its duration at a lower rate
+        if self._skip > 0:
+            self._skip -= 1
+            self._drop(1)
+            return
+        if 0 < self.bound <= len(self.queue):
+            # keep every other frame counting back from the incoming one, then halve the incoming rate too
+            kept = deque()
+            odd = True
+            for queued in reversed(self.queue):
+                if isPriority(queued) or not odd:
+                    kept.appendleft(queued)
+                if not isPriority(queued):
+                    odd = not odd
+            self._drop(len(self.queue) - len(kept))
+            self.queue = kept
+            self._stride *= 2
+        self._skip = self._stride - 1
+        self.queue.append(item)
+
+
+__all__ = ["QUEUE_POLICIES", "ClientQueue"]
@@ -0,0 +1,266 @@
+import threading
+import time
+
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CLIENT_STATS = dict()
+
+LATENCY_BUCKETS = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Histogram:
+    # fixed buckets, so observing is a bisect and an increment
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def count(self):
+        return sum(self.counts)
+
+    def cumulative(self):
+        total = 0
+        for bound, n in zip(self.bounds + (float("inf"),), self.counts):
+            total += n
+            yield bound, total
+
+    def quantile(self, q: float):
+        # upper bound of the bucket holding the q-th observation
+        total = self.count()
+        if total == 0:
+            return 0.0
+        for bound, seen in self.cumulative():
+            if seen >= q * total:
+                return bound if bound != float("inf") else self.bounds[-1]
+        return self.bounds[-1]
+
+
+class ClientStats:
+    __slots__ = (
+        "packets",
+        "frames",
+        "skeletons",
+        "skeletonChanges",
+        "errors",
+        "dropped",
+        "lost",
+        "reordered",
+        "relayed",
+        "lastFnum",
+        "queueDepth",
+        "queueHighWater",
+        "lagTotal",
+        "lagMax",
+        "decode",
+        "queueWait",
+        "write",
+        "flush",
+    )
+
+    def __init__(self):
+        self.packets = 0
+        self.frames = 0
+        self.skeletons = 0
+        self.skeletonChanges = 0
+        self.errors = 0
+        self.dropped = 0
+        self.lost = 0
+        self.reordered = 0
+        self.relayed = 0
+        self.lastFnum = None
+        self.queueDepth = 0
+        self.queueHighWater = 0
+        self.lagTotal = 0.0
+        self.lagMax = 0.0
+        self.decode = Histogram()
+        self.queueWait = Histogram()
+        self.write = Histogram()
+        self.flush = Histogram()
+
+    def received(self, depth: int, decode: float = None, dropped: int = 0, relayed: int = 0):
+        self.packets += 1
+        self.relayed += relayed
+        self.dropped = dropped
+        self.queueDepth = depth
+        if depth > self.queueHighWater:
+            self.queueHighWater = depth
+        if decode is not None:
+            self.decode.observe(decode)
+
+    def written(self, fnum: int, lag: float):
+        self.frames += 1
+        if self.lastFnum is not None:
+            if fnum > self.lastFnum + 1:
+                self.lost += fnum - self.lastFnum - 1
+            elif fnum < self.lastFnum:
+                # a late frame fills a gap that was already counted as lost
+                self.reordered += 1
+                self.lost = max(0, self.lost - 1)
+            elif fnum == self.lastFnum:
+                self.reordered += 1
+        if self.lastFnum is None or fnum > self.lastFnum:
+            self.lastFnum = fnum
+        self.lagTotal += lag
+        if lag > self.lagMax:
+            self.lagMax = lag
+
+    def lagMean(self):
+        return self.lagTotal / self.frames if self.frames > 0 else 0.0
+
+
+def clientStats(client_address) -> ClientStats:
+    stats = CLIENT_STATS.get(client_address)
+    if stats is None:
+        stats = CLIENT_STATS.setdefault(client_address, ClientStats())
+    return stats
+
+
+COUNTERS = (
+    ("packets", "smf_packets_total", "Datagrams received."),
+    ("frames", "smf_frames_total", "Frames handed to the writer."),
+    ("skeletons", "smf_skeletons_total", "Skeleton definitions received."),
+    ("skeletonChanges", "smf_skeleton_changes_total", "Skeleton definitions that differed from the previous one."),
+    ("errors", "smf_errors_total", "Queue items the worker failed to handle."),
+    ("dropped", "smf_dropped_total", "Queue items discarded by the queue policy."),
+    ("lost", "smf_frames_lost_total", "Frames missing from the fnum sequence, dropped ones included."),
+    ("reordered", "smf_frames_reordered_total", "Frames that arrived late or twice."),
+    ("relayed", "smf_relayed_total", "Datagrams forwarded to relay targets, one per target."),
+)
+GAUGES = (
+    ("queueDepth", "smf_queue_depth", "Worker queue depth at the last enqueue."),
+    ("queueHighWater", "smf_queue_high_water", "Deepest worker queue seen."),
+)
+HISTOGRAMS = (
+    ("decode", "smf_decode_seconds", "Time to decode a datagram."),
+    ("queueWait", "smf_queue_wait_seconds", "Time from enqueue to worker dequeue."),
+    ("write", "smf_write_seconds", "Time spent in addTimesample."),
+    ("flush", "smf_clip_flush_seconds", "Time to write or submit a finished clip."),
+)
+
+
+def clientLabel(client_address):
+    return "{}:{}".format(*client_address)
+
+
+def renderPrometheus(stats: dict = CLIENT_STATS):
+    clients = [(clientLabel(addr), s) for addr, s in list(stats.items())]
+    lines = list()
+    for attr, name, text in COUNTERS:
+        lines += [f"# HELP {name} {text}", f"# TYPE {name} counter"]
+        lines += [f'{name}{{client="{c}"}} {getattr(s, attr)}' for c, s in clients]
+    for attr, name, text in GAUGES:
+        lines += [f"# HELP {name} {text}", f"# TYPE {name} gauge"]
+        lines += [f'{name}{{client="{c}"}} {getattr(s, attr)}' for c, s in clients]
+    for attr, name, text in HISTOGRAMS:
+        lines += [f"# HELP {name} {text}", f"# TYPE {name} histogram"]
+        for c, s in clients:
+            h = getattr(s, attr)
+            total = 0
+            for bound, total in h.cumulative():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{client="{c}",le="{le}"}} {total}')
+            lines.append(f'{name}_sum{{client="{c}"}} {h.sum}')
+            lines.append(f'{name}_count{{client="{c}"}} {total}')
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = renderPrometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def statsLine(client_address, stats: ClientStats, previous: tuple, interval: float):
+    packets, frames = previous
+    return (
+        "[stats] {} pkt/s={:.0f} frame/s={:.0f} lost={} dropped={} reordered={} errors={} queue={}/{} "
+        "decode_p99={:.3f}ms wait_p99={:.3f}ms write_p99={:.3f}ms flush_p99={:.3f}ms".format(
+            clientLabel(client_address),
+            (stats.packets - packets) / interval,
+            (stats.frames - frames) / interval,
+            stats.lost,
+            stats.dropped,
+            stats.reordered,
+            stats.errors,
+            stats.queueDepth,
+            stats.queueHighWater,
+            stats.decode.quantile(0.99) * 1000,
+            stats.queueWait.quantile(0.99) * 1000,
+            stats.write.quantile(0.99) * 1000,
+            stats.flush.quantile(0.99) * 1000,
+        )
+    )
+
+
+def reportStats(interval: float, stop: threading.Event):
+    previous = dict()
+    last = time.perf_counter()
+    while not stop.wait(interval):
+        now = time.perf_counter()
+        for addr, stats in list(CLIENT_STATS.items()):
+            print(statsLine(addr, stats, previous.get(addr, (0, 0)), now - last))
+            previous[addr] = (stats.packets, stats.frames)
+        last = now
+
+
+def startMetrics(metrics_port: int = None, stats_interval: float = 0):
+    stopper = list()
+    if metrics_port is not None:
+        httpd = ThreadingHTTPServer(("127.0.0.1", metrics_port), MetricsHandler)
+        httpd.daemon_threads = True
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        stopper.append(lambda: (httpd.shutdown(), httpd.server_close()))
+    if stats_interval > 0:
+        stop = threading.Event()
+        reporter = threading.Thread(target=reportStats, args=(stats_interval, stop), daemon=True)
+        reporter.start()
+        stopper.append(lambda: (stop.set(), reporter.join()))
+    return lambda: [s() for s in stopper]
+
+
+__all__ = [
+    "CLIENT_STATS",
+    "Histogram",
+    "ClientStats",
+    "clientStats",
+    "renderPrometheus",
+    "MetricsHandler",
+    "startMetrics",
+]
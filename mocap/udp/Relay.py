@@ -0,0 +1,53 @@
+import ipaddress
+import socket
+
+
+def parseTarget(target: str):
+    host, port = target.rsplit(":", 1)
+    return socket.gethostbyname(host), int(port)
+
+
+class Relay:
+    # forwards datagrams untouched, before they are decoded
+    def __init__(self, targets: list, ttl: int = 1, interface: str = None):
+        self.targets = [parseTarget(t) for t in targets]
+        self.multicast = any(ipaddress.ip_address(host).is_multicast for host, _ in self.targets)
+        self.ttl = ttl
+        self.interface = interface
+        self.senders = dict()
+        self.failing = set()
+
+    def sender(self, client_address):
+        # one source port per suit, so whatever listens downstream still tells the suits apart
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.setblocking(False)
+        if self.multicast:
+            s.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, self.ttl)
+            if self.interface is not None:
+                s.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(self.interface))
+        self.senders[client_address] = s
+        return s
+
+    def forward(self, data: bytes, client_address):
+        s = self.senders.get(client_address) or self.sender(client_address)
+        sent = 0
+        for target in self.targets:
+            try:
+                s.sendto(data, target)
+                sent += 1
+                if self.failing:
+                    self.failing.discard(target)
+            except OSError as e:
+                # a target that is down must not slow the receiver, report it once
+                if target not in self.failing:
+                    self.failing.add(target)
+                    print("relay to {}:{} failed: {}".format(*target, e))
+        return sent
+
+    def close(self):
+        for s in self.senders.values():
+            s.close()
+        self.senders.clear()
+
+
+__all__ = ["parseTarget", "Relay"]
@@ -0,0 +1,44 @@
+import socket
+import time
+
+from mocap.Reader.MocopiCapture import CaptureReader
+from mocap.udp.SMFReciever import AsyncUDPProtocol
+
+
+def pacedRecords(capture: CaptureReader, speed: float):
+    # speed <= 0 replays as fast as possible
+    origin = None
+    started = time.perf_counter()
+    for recvTime, client_address, data in capture:
+        if origin is None:
+            origin = recvTime
+        if speed > 0:
+            wait = (recvTime - origin) / speed - (time.perf_counter() - started)
+            if wait > 0:
+                time.sleep(wait)
+        yield recvTime, client_address, data
+
+
+def replayToWriters(capture: CaptureReader, speed: float = 0):
+    protocol = AsyncUDPProtocol()
+    try:
+        for recvTime, client_address, data in pacedRecords(capture, speed):
+            protocol.dispatch(data, client_address, recvTime)
+    finally:
+        protocol.close()
+
+
+def replayToSocket(capture: CaptureReader, target_address, speed: float = 1):
+    # each recorded client gets its own source port, so the receiver still tells them apart
+    senders = dict()
+    try:
+        for _, client_address, data in pacedRecords(capture, speed):
+            if client_address not in senders:
+                senders[client_address] = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            senders[client_address].sendto(data, target_address)
+    finally:
+        for s in senders.values():
+            s.close()
+
+
+__all__ = ["pacedRecords", "replayToWriters", "replayToSocket"]
@@ -1,14 +1,20 @@
+import asyncio
 import threading
 import socketserver
 import queue
+import time
 
 from datetime import datetime
 
-from mocap.Reader.MocopiUDP import decomposePacket
-from mocap.Writer import USDWriter, BVHWriter, DebugWriter
+from mocap.Reader.MocopiUDP import decomposePacket, skeletonFingerprint
+from mocap.Writer import USDWriter, BVHWriter, DebugWriter, CaptureWriter, RetargetWriter, SharedMemoryWriter
+
+from .ClientQueue import ClientQueue
+from .Metrics import CLIENT_STATS, ClientStats, clientStats
 
 CLIENT_QUEUES = dict()
 CLIENT_QUEUES_LOCK = threading.Semaphore()
+CLIENT_WORKERS = dict()
 
 # TODO
 # impl more sane way
@@ -16,9 +22,15 @@ WRITERS = {
     "usd": USDWriter,
     "bvh": BVHWriter,
     "debug": DebugWriter,
+    "capture": CaptureWriter,
+    "retarget": RetargetWriter,
+    "shm": SharedMemoryWriter,
 }
 WRITER_OF_CHOICE = str()
 WRITER_OPTIONS = dict()
+QUEUE_SIZE = 0
+QUEUE_POLICY = "drop-oldest"
+RELAY = None
 # impl more sane way
 # TODO
 
@@ -27,10 +39,15 @@ def worker(title: str, qs: dict, qk):
     q = qs[qk]
     flag = True
     skel = list()
+    skelFingerprint = None
     frame_offset = None
     title = datetime.now().strftime("%Y-%m-%d-%H-%M-%S_") + title
 
     writer = WRITERS[WRITER_OF_CHOICE](title, **WRITER_OPTIONS)
+    addPacket = getattr(writer, "addPacket", None)
+    stats = clientStats(qk)
+    if hasattr(writer, "onFlush"):
+        writer.onFlush = stats.flush.observe
 
     while flag:
         try:
@@ -39,21 +56,39 @@ def worker(title: str, qs: dict, qk):
             except queue.Empty:
                 flag = False
                 continue
+            dequeued = time.perf_counter()
             if "STOP_TOKEN" in item:
                 flag = False
                 break
+            if "ENQUEUE_TIME" in item:
+                stats.queueWait.observe(dequeued - item["ENQUEUE_TIME"])
+
+            if addPacket is not None and "RAW_PACKET" in item:
+                addPacket(*item["RAW_PACKET"])
 
             if "fram" in item:
                 if not frame_offset:
                     frame_offset = item["fram"]["fnum"]
+                started = time.perf_counter()
                 writer.addTimesample(item["fram"])
+                stats.write.observe(time.perf_counter() - started)
+                if "RAW_PACKET" in item:
+                    stats.written(item["fram"]["fnum"], time.time() - item["RAW_PACKET"][0])
             elif "skdf" in item:
-                skel = item["skdf"]["btrs"]
-                writer.updateSkeleton(skel)
+                fingerprint = item.get("SKDF_FINGERPRINT")
+                if fingerprint is None or fingerprint != skelFingerprint:
+                    if skelFingerprint is not None:
+                        print(f"{title}: skeleton changed after frame {stats.lastFnum}")
+                        stats.skeletonChanges += 1
+                    skelFingerprint = fingerprint
+                    skel = item["skdf"]["btrs"]
+                    writer.updateSkeleton(skel)
+                stats.skeletons += 1
             else:
                 pass
             q.task_done()
         except Exception as e:
+            stats.errors += 1
             print(e)
 
     qs.pop(qk)
@@ -67,13 +102,17 @@ def worker(title: str, qs: dict, qk):
 class ThreadedUDPHandler(socketserver.BaseRequestHandler):
     def handle(self):
         data = self.request[0]
-        dec = decomposePacket(data)
+        relayed = RELAY.forward(data, self.client_address) if RELAY is not None else 0
+        started = time.perf_counter()
+        fingerprint = skeletonFingerprint(data)
+        dec = decomposePacket(data, fingerprint)
+        dec["SKDF_FINGERPRINT"] = fingerprint
+        enqueued = dec["ENQUEUE_TIME"] = time.perf_counter()
+        dec["RAW_PACKET"] = (time.time(), self.client_address, data)
         with CLIENT_QUEUES_LOCK:
-            if self.client_address in CLIENT_QUEUES.keys():
-                CLIENT_QUEUES[self.client_address].put_nowait(dec)
-            else:
-                CLIENT_QUEUES[self.client_address] = queue.Queue()
-                threading.Thread(
+            if self.client_address not in CLIENT_QUEUES.keys():
+                CLIENT_QUEUES[self.client_address] = ClientQueue(QUEUE_SIZE, QUEUE_POLICY)
+                CLIENT_WORKERS[self.client_address] = threading.Thread(
                     target=worker,
                     daemon=True,
                     args=(
@@ -81,14 +120,88 @@ class ThreadedUDPHandler(socketserver.BaseRequestHandler):
                         CLIENT_QUEUES,
                         self.client_address,
                     ),
-                ).start()
+                )
+                CLIENT_WORKERS[self.client_address].start()
+            q = CLIENT_QUEUES[self.client_address]
+        q.put(dec)
+        clientStats(self.client_address).received(q.qsize(), enqueued - started, q.dropped, relayed)
 
 
 class ThreadedUDPServer(socketserver.ThreadingMixIn, socketserver.UDPServer):
     def server_close(self):
-        for q in CLIENT_QUEUES.values():
-            q.put_nowait({"STOP_TOKEN": True})
+        for q in list(CLIENT_QUEUES.values()):
+            q.put({"STOP_TOKEN": True})
+        for t in list(CLIENT_WORKERS.values()):
+            t.join()
+        CLIENT_WORKERS.clear()
         return super().server_close()
 
 
-__all__ = ["WRITERS", "ThreadedUDPHandler", "ThreadedUDPServer"]
+class AsyncUDPProtocol(asyncio.DatagramProtocol):
+    # every datagram arrives on the event loop thread, so the client table needs no lock
+    def __init__(self):
+        self.queues_ = dict()
+        self.workers_ = dict()
+
+    def datagram_received(self, data, client_address):
+        self.dispatch(data, client_address, time.time())
+
+    def dispatch(self, data, client_address, recvTime):
+        relayed = RELAY.forward(data, client_address) if RELAY is not None else 0
+        started = time.perf_counter()
+        fingerprint = skeletonFingerprint(data)
+        dec = decomposePacket(data, fingerprint)
+        dec["SKDF_FINGERPRINT"] = fingerprint
+        enqueued = dec["ENQUEUE_TIME"] = time.perf_counter()
+        dec["RAW_PACKET"] = (recvTime, client_address, data)
+        q = self.queues_.get(client_address)
+        if q is None:
+            q = self.queues_[client_address] = ClientQueue(QUEUE_SIZE, QUEUE_POLICY)
+            self.workers_[client_address] = threading.Thread(
+                target=worker,
+                daemon=True,
+                args=(
+                    "{}_{}".format(*client_address),
+                    self.queues_,
+                    client_address,
+                ),
+            )
+            self.workers_[client_address].start()
+        q.put(dec)
+        clientStats(client_address).received(q.qsize(), enqueued - started, q.dropped, relayed)
+
+    def close(self):
+        for q in list(self.queues_.values()):
+            q.put({"STOP_TOKEN": True})
+        for t in self.workers_.values():
+            t.join()
+
+
+def serveAsyncio(server_address, stop: threading.Event = None, reusePort: bool = False):
+    async def serve():
+        loop = asyncio.get_running_loop()
+        transport, protocol = await loop.create_datagram_endpoint(
+            AsyncUDPProtocol, local_addr=server_address, reuse_port=reusePort
+        )
+        try:
+            if stop is None:
+                await loop.create_future()
+            else:
+                while not stop.is_set():
+                    await asyncio.sleep(0.1)
+        finally:
+            transport.close()
+            protocol.close()
+
+    asyncio.run(serve())
+
+
+__all__ = [
+    "WRITERS",
+    "CLIENT_STATS",
+    "ClientStats",
+    "ThreadedUDPHandler",
+    "ThreadedUDPServer",
+    "AsyncUDPProtocol",
+    "serveAsyncio",
+]
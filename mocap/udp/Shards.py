@@ -0,0 +1,120 @@
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+from multiprocessing.connection import wait
+
+from mocap.Reader.SharedPoses import closePublishers
+from mocap.Writer.ClipWriterPool import shutdownClipWriterPool
+
+from . import Metrics, SMFReciever
+
+# a shard that dies sooner than this after starting is not restarted, it would most likely die again
+RESTART_GRACE = 2.0
+SHUTDOWN_TIMEOUT = 60.0
+
+
+class ReusePortUDPServer(SMFReciever.ThreadedUDPServer):
+    allow_reuse_port = True
+
+
+def runShard(index: int, server: str, server_address, options: dict, stop):
+    # the supervisor owns Ctrl-C and tells every shard to stop through the event, so writers close cleanly
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    SMFReciever.WRITER_OF_CHOICE = options["writer"]
+    SMFReciever.WRITER_OPTIONS = options
+    SMFReciever.QUEUE_SIZE = options["queue_size"]
+    SMFReciever.QUEUE_POLICY = options["queue_policy"]
+    if options.get("relay") is not None:
+        from .Relay import Relay
+
+        SMFReciever.RELAY = Relay(options["relay"], options["relay_ttl"], options["relay_interface"])
+    metricsPort = options.get("metrics_port")
+    stopMetrics = Metrics.startMetrics(
+        metricsPort + index if metricsPort is not None else None, options.get("stats_interval", 0)
+    )
+
+    try:
+        if server == "asyncio":
+            SMFReciever.serveAsyncio(server_address, stop, reusePort=True)
+        else:
+            with ReusePortUDPServer(server_address, SMFReciever.ThreadedUDPHandler) as udp:
+                threading.Thread(target=lambda: (stop.wait(), udp.shutdown()), daemon=True).start()
+                udp.serve_forever()
+    finally:
+        stopMetrics()
+        shutdownClipWriterPool()
+        closePublishers()
+
+
+def shareOf(total: int, index: int, processes: int):
+    # total split over the shards, the first ones take the remainder and each gets at least one
+    return max(1, total // processes + (1 if index < total % processes else 0))
+
+
+def shardOptions(options: dict, index: int, processes: int):
+    options = dict(options)
+    # one clip writer pool per shard, so the pool size the user asked for (or the CPU count) is shared out
+    workers = options.get("clip_workers")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers > 0:
+        options["clip_workers"] = shareOf(workers, index, processes)
+    if options.get("clip_queue") is not None:
+        options["clip_queue"] = shareOf(options["clip_queue"], index, processes)
+    # every shard creates its own pose ring, they would take over each other's segment otherwise
+    if "shm_name" in options:
+        options["shm_name"] = "{}_{}".format(options["shm_name"], index)
+    return options
+
+
+def terminate(signum, frame):
+    raise KeyboardInterrupt
+
+
+def superviseShards(processes: int, server: str, server_address, options: dict):
+    # SO_REUSEPORT hashes each client address to one shard, so a suit's queue and writer live in a single process
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    options = {k: v for k, v in options.items() if k != "func"}
+
+    def start(index):
+        shard = context.Process(
+            target=runShard,
+            name=f"smf-shard-{index}",
+            args=(index, server, server_address, shardOptions(options, index, processes), stop),
+        )
+        shard.start()
+        return shard, time.perf_counter()
+
+    signal.signal(signal.SIGTERM, terminate)
+    shards = [start(i) for i in range(processes)]
+    print("{} receiver processes on {}:{}".format(processes, *server_address))
+    try:
+        while True:
+            wait([s.sentinel for s, _ in shards])
+            for i, (shard, started) in enumerate(shards):
+                if shard.is_alive():
+                    continue
+                if time.perf_counter() - started < RESTART_GRACE:
+                    print(f"shard {i} exited with {shard.exitcode} right after starting, stopping")
+                    return
+                print(f"shard {i} exited with {shard.exitcode}, restarting")
+                shards[i] = start(i)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        deadline = time.perf_counter() + SHUTDOWN_TIMEOUT
+        for i, (shard, _) in enumerate(shards):
+            shard.join(max(0.0, deadline - time.perf_counter()))
+            if shard.is_alive():
+                print(f"shard {i} did not stop in time, terminating")
+                shard.terminate()
+                shard.join()
+
+
+__all__ = ["ReusePortUDPServer", "runShard", "superviseShards"]
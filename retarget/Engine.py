@@ -0,0 +1,92 @@
+import numpy as np
+
+from mocap.Writer.quatMath import quatConjugate, quatFromMatrix, quatMultiply
+from mocap.Writer.skelTree import FlatSkeleton
+
+
+def compileMapping(mapping: dict, sourceJoints: list):
+    # target joint -> chain of source joint names, as a [targets, longest chain] index array padded with -1
+    index = {name: i for i, name in enumerate(sourceJoints)}
+    targets = list()
+    chains = list()
+    for target, chain in mapping.items():
+        if len(chain) == 0 or None in chain:
+            continue
+        missing = [c for c in chain if c not in index]
+        if len(missing) > 0:
+            print(f"{target}: source joints {missing} not found, skipped")
+            continue
+        targets.append(target)
+        chains.append([index[c] for c in chain])
+
+    sources = np.full((len(chains), max(map(len, chains), default=1)), -1, dtype=np.int64)
+    for i, chain in enumerate(chains):
+        sources[i, : len(chain)] = chain
+    return targets, sources
+
+
+def composeChains(rotations, sources):
+    # rotations [..., joints, 4]; every chain is multiplied out root side first, as Gf.Quatf *= did
+    result = rotations[..., sources[:, 0], :]
+    for k in range(1, sources.shape[1]):
+        valid = sources[:, k] >= 0
+        result[..., valid, :] = quatMultiply(result[..., valid, :], rotations[..., sources[valid, k], :])
+    return result
+
+
+class RetargetEngine:
+    def __init__(
+        self,
+        mapping: dict,
+        sourceJoints: list,
+        targetSkeleton: FlatSkeleton = None,
+        sourceRests=None,
+        rootJoint: str = "root",
+        rootScale: float = 1.0,
+    ):
+        self.targets, self.sources = compileMapping(mapping, sourceJoints)
+        count = len(self.targets)
+
+        # source rests are [joints, 4] rotations, mocopi and USDWriter takes rest at identity
+        restS = np.tile(np.array([0.0, 0.0, 0.0, 1.0]), (count, 1))
+        if sourceRests is not None:
+            restS = composeChains(np.asarray(sourceRests, dtype=np.float64), self.sources)
+
+        restT = np.tile(np.array([0.0, 0.0, 0.0, 1.0]), (count, 1))
+        self.restTranslations = None
+        if targetSkeleton is not None:
+            index = {p: i for i, p in enumerate(targetSkeleton.paths)}
+            rows = [index[t] for t in self.targets]
+            rests = targetSkeleton.restTransforms[rows]
+            restT = quatFromMatrix(np.swapaxes(rests, -1, -2))
+            self.restTranslations = rests[:, 3, :3].astype(np.float32)
+
+        # a source joint at its rest pose lands the target joint on its own rest pose
+        self.offsets = quatMultiply(restT, quatConjugate(restS)).astype(np.float32)
+
+        self.rootSource = sourceJoints.index(rootJoint) if rootJoint in sourceJoints else None
+        self.rootTargets = np.flatnonzero(self.sources[:, 0] == self.rootSource)
+        self.rootScale = rootScale
+
+    def __len__(self):
+        return len(self.targets)
+
+    def solve(self, rotations, translations):
+        # [..., source joints, 4|3] to [..., targets, 4|3], works on a single frame or a whole take
+        rotations = np.asarray(rotations, dtype=np.float32)
+        translations = np.asarray(translations, dtype=np.float32)
+        solved = quatMultiply(self.offsets, composeChains(rotations, self.sources))
+
+        if self.restTranslations is None:
+            # without a target rest pose the chain offsets are summed, like the original script
+            valid = self.sources >= 0
+            offsets = translations[..., np.where(valid, self.sources, 0), :]
+            return solved, (offsets * valid[..., None]).sum(axis=-2)
+
+        moved = np.broadcast_to(self.restTranslations, rotations.shape[:-2] + self.restTranslations.shape).copy()
+        if self.rootSource is not None and len(self.rootTargets) > 0:
+            moved[..., self.rootTargets, :] = translations[..., [self.rootSource], :] * self.rootScale
+        return solved, moved
+
+
+__all__ = ["compileMapping", "composeChains", "RetargetEngine"]
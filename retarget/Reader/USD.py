@@ -1,15 +1,18 @@
 from pathlib import Path
 from collections import defaultdict
 
-from pxr import Gf, Usd, UsdSkel
-from constants import PMX_COMMON_BONE_NAMES_MOCOPI_MAPPING
+import numpy as np
+from pxr import Usd, UsdSkel
+from mocap.Writer.skelTree import FlatSkeleton
+
+from .constants import PMX_COMMON_BONE_NAMES_MOCOPI_MAPPING
 
 PMX_COMMON_BONE_NAMES = PMX_COMMON_BONE_NAMES_MOCOPI_MAPPING.keys()
 
 
 class TargetCharacter:
     def __init__(self, infile: Path, skelPath: str = None):
-        self._stage = Usd.Stage.Open(infile)
+        self._stage = Usd.Stage.Open(str(infile))
 
         self._skeletonPrim = None
         if skelPath is None:
@@ -42,13 +45,19 @@ class TargetCharacter:
 
         return ret
 
+    def skeleton(self):
+        joints = self._skeleton.GetJointsAttr().Get()
+        restTransforms = self._skeleton.GetRestTransformsAttr().Get()
+        return FlatSkeleton.fromJointPaths(joints, np.array(restTransforms) if restTransforms else None)
+
 
 class AnimationReader:
     def __init__(self, infile: Path, animPath: str = None):
         from math import floor, ceil
 
-        self._stage = Usd.Stage.Open(infile)
+        self._stage = Usd.Stage.Open(str(infile))
 
+        self.framesPerSecond = self._stage.GetFramesPerSecond()
         self.startTimeCode = floor(self._stage.GetStartTimeCode())
         self.endTimeCode = ceil(self._stage.GetEndTimeCode())
 
@@ -60,13 +69,46 @@ class AnimationReader:
                     self._skelanim = UsdSkel.Animation(prim)
         else:
             prim = self._stage.GetPrimAtPath(animPath)
-            if prim.IsA(UsdSkel.Skeleton):
+            if prim.IsA(UsdSkel.Animation):
                 self._skelanimPrim = prim
-                self._skelanim = UsdSkel.Skeleton(prim)
+                self._skelanim = UsdSkel.Animation(prim)
 
         if self._skelanimPrim is None:
             raise RuntimeError("No skelAnim")
 
+        self._animQuery = UsdSkel.Cache().GetAnimQuery(self._skelanim)
+        if not self._stage.HasAuthoredTimeCodeRange():
+            samples = self._animQuery.GetJointTransformTimeSamples()
+            if len(samples) > 0:
+                self.startTimeCode = floor(samples[0])
+                self.endTimeCode = ceil(samples[-1])
+
+    def jointNames(self):
+        return [Path(j).name for j in self._animQuery.GetJointOrder()]
+
+    def collectArrays(self, start: int = None, stop: int = None):
+        # every timecode in start..stop as [frames, joints, 4] (x, y, z, w) rotations and [frames, joints, 3]
+        # translations; the query resolves value clips in C++ so Python only sees one call per frame
+        start = self.startTimeCode if start is None else start
+        stop = self.endTimeCode if stop is None else stop
+        times = np.arange(start, stop + 1)
+
+        joints = len(self._animQuery.GetJointOrder())
+        rotations = np.empty((len(times), joints, 4), dtype=np.float32)
+        translations = np.empty((len(times), joints, 3), dtype=np.float32)
+        if not self._animQuery.JointTransformsMightBeTimeVarying():
+            # a single authored sample is not a default value, EarliestTime resolves to either
+            tra, rot, _ = self._animQuery.ComputeJointLocalTransformComponents(Usd.TimeCode.EarliestTime())
+            rotations[:] = rot
+            translations[:] = tra
+            return times, rotations, translations
+
+        for i, t in enumerate(times.tolist()):
+            tra, rot, _ = self._animQuery.ComputeJointLocalTransformComponents(t)
+            rotations[i] = rot
+            translations[i] = tra
+        return times, rotations, translations
+
     def _collectTransforms(self):
         joints = self._skelanim.GetJointsAttr().Get()
 
@@ -87,54 +129,4 @@ class AnimationReader:
         return retR, retT
 
 
-if __name__ == "__main__":
-    animation = AnimationReader("ACTOR_USD")
-    rotations, translations = animation._collectTransforms()
-
-    target = TargetCharacter("CHARACTER_USD")
-    joints_combinations = target._findMapping()
-
-    news = defaultdict(dict)
-
-    for t in range(animation.startTimeCode, animation.endTimeCode + 1):
-        for j, src in joints_combinations.items():
-            resultR = Gf.Quatf(1, 0, 0, 0)
-            resultT = Gf.Vec3f(0, 0, 0)
-            for j in src:
-                resultR *= rotations[t][j]
-                resultT += translations[t][j]
-            news[t][j] = (resultR, resultT)
-
-    #'''
-    stage = Usd.Stage.CreateInMemory()
-    stage.SetStartTimeCode(animation.startTimeCode)
-    stage.SetEndTimeCode(animation.endTimeCode)
-
-    animPrim = UsdSkel.Animation.Define(stage, "/Motion")
-    stage.SetDefaultPrim(animPrim.GetPrim())
-
-    animPrim.CreateJointsAttr().Set(list(joints_combinations.keys()))
-    rotationsAttr = animPrim.CreateRotationsAttr()
-    translationsAttr = animPrim.CreateTranslationsAttr()
-    animPrim.CreateScalesAttr().Set(
-        [
-            Gf.Vec3h(1, 1, 1),
-        ]
-        * len(joints_combinations.keys())
-    )
-
-    for time, poses in sorted(news.items()):
-        rotation_series = list()
-        translation_series = list()
-
-        for joint, pose in poses.items():
-            r, t = pose
-            rotation_series.append(r)
-            translation_series.append(t)
-
-        rotationsAttr.Set(rotation_series, time)
-        translationsAttr.Set(translation_series, time)
-
-    layer = stage.GetEditTarget().GetLayer()
-    layer.TransferContent(stage.GetRootLayer())
-    layer.Export("test.usda")
+__all__ = ["PMX_COMMON_BONE_NAMES", "TargetCharacter", "AnimationReader"]
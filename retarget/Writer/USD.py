@@ -0,0 +1,42 @@
+import numpy as np
+from pxr import Sdf, Vt
+
+
+def saveAnimation(file: str, joints: list, times, rotations, translations, framesPerSecond: float = None):
+    # rotations [frames, joints, 4] (x, y, z, w) and translations [frames, joints, 3] as one SkelAnimation
+    rotations = np.ascontiguousarray(rotations, dtype=np.float32)
+    translations = np.ascontiguousarray(translations, dtype=np.float32)
+    timecodes = np.asarray(times).tolist()
+
+    layer = Sdf.Layer.CreateAnonymous(".usd")
+    with Sdf.ChangeBlock():
+        animPrim = Sdf.CreatePrimInLayer(layer, "/Motion")
+        animPrim.specifier = Sdf.SpecifierDef
+        animPrim.typeName = "SkelAnimation"
+
+        jointsAttr = Sdf.AttributeSpec(
+            animPrim, "joints", Sdf.ValueTypeNames.TokenArray, variability=Sdf.VariabilityUniform
+        )
+        jointsAttr.default = Vt.TokenArray(joints)
+        scalesAttr = Sdf.AttributeSpec(animPrim, "scales", Sdf.ValueTypeNames.Half3Array)
+        scalesAttr.default = Vt.Vec3hArray.FromNumpy(np.ones((len(joints), 3), dtype=np.float16))
+
+        rotationsAttr = Sdf.AttributeSpec(animPrim, "rotations", Sdf.ValueTypeNames.QuatfArray)
+        translationsAttr = Sdf.AttributeSpec(animPrim, "translations", Sdf.ValueTypeNames.Float3Array)
+
+        for i, time in enumerate(timecodes):
+            layer.SetTimeSample(rotationsAttr.path, time, Vt.QuatfArray.FromNumpy(rotations[i]))
+            layer.SetTimeSample(translationsAttr.path, time, Vt.Vec3fArray.FromNumpy(translations[i]))
+
+        layer.defaultPrim = "Motion"
+        if len(timecodes) > 0:
+            layer.startTimeCode = timecodes[0]
+            layer.endTimeCode = timecodes[-1]
+        if framesPerSecond is not None:
+            layer.framesPerSecond = framesPerSecond
+            layer.timeCodesPerSecond = framesPerSecond
+
+    layer.Export(file)
+
+
+__all__ = ["saveAnimation"]
@@ -0,0 +1,51 @@
+def run_retarget(args):
+    import time
+
+    from retarget.Engine import RetargetEngine
+    from retarget.Reader.USD import AnimationReader, TargetCharacter
+    from retarget.Writer.USD import saveAnimation
+
+    started = time.perf_counter()
+    animation = AnimationReader(args.animation, args.anim_path)
+    target = TargetCharacter(args.character, args.skel_path)
+
+    engine = RetargetEngine(
+        target._findMapping(),
+        animation.jointNames(),
+        targetSkeleton=None if args.keep_offsets else target.skeleton(),
+        rootScale=args.scale,
+    )
+    times, rotations, translations = animation.collectArrays(args.start, args.stop)
+    loaded = time.perf_counter()
+
+    rotations, translations = engine.solve(rotations, translations)
+    solved = time.perf_counter()
+
+    saveAnimation(args.output.as_posix(), engine.targets, times, rotations, translations, animation.framesPerSecond)
+    print(
+        "{} frames, {} joints: read {:.2f}s, solve {:.2f}s, write {:.2f}s".format(
+            len(times), len(engine), loaded - started, solved - loaded, time.perf_counter() - solved
+        )
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    from pathlib import Path
+
+    parser = argparse.ArgumentParser(prog="retarget")
+    parser.add_argument("animation", type=Path, help="mocopi take, e.g. a USDWriter recording")
+    parser.add_argument("character", type=Path, help="target character with a UsdSkel skeleton")
+    parser.add_argument("-o", "--output", type=Path, metavar="OUTPUT", default=Path("retarget.usd"))
+    parser.add_argument("--anim-path", type=str, default=None)
+    parser.add_argument("--skel-path", type=str, default=None)
+    parser.add_argument("--start", type=int, default=None)
+    parser.add_argument("--stop", type=int, default=None)
+    parser.add_argument("--scale", type=float, default=1.0, help="root translation scale, source to target units")
+    parser.add_argument(
+        "--keep-offsets", action="store_true", help="skip rest compensation and sum the source offsets"
+    )
+    parser.set_defaults(func=run_retarget)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from mocap.Reader.BVHParser import parseBVH
+from mocap.Writer.BVHWriter import BVHWriter
+
+
+def spinningSkeleton():
+    return [
+        {"bnid": 0, "pbid": 65535, "tran": {"rotation": (0, 0, 0, 1), "translation": (0, 0.9, 0)}},
+        {"bnid": 1, "pbid": 0, "tran": {"rotation": (0, 0, 0, 1), "translation": (0, 0.1, 0)}},
+    ]
+
+
+def spinningSample(fnum: int):
+    # the root turns 2.5 degrees a frame about Y, several whole turns over the take
+    angle = np.radians(2.5 * fnum) * 0.5
+    return {
+        "fnum": fnum,
+        "uttm": fnum / 60,
+        "btrs": [
+            {"bnid": 0, "tran": {"rotation": (0, np.sin(angle), 0, np.cos(angle)), "translation": (0, 0.9, 0)}},
+            {"bnid": 1, "tran": {"rotation": (0, 0, 0, 1), "translation": (0, 0.1, 0)}},
+        ],
+    }
+
+
+@pytest.mark.parametrize("mode", ["stream", "merge"])
+@pytest.mark.parametrize("workers", [0, 2])
+def test_unwrap_carries_across_chunks(tmp_path, mode, workers):
+    writer = BVHWriter("spin", output_base=tmp_path, stride=100, bvh_mode=mode, clip_workers=workers)
+    writer.updateSkeleton(spinningSkeleton())
+    for f in range(450):
+        writer.addTimesample(spinningSample(f))
+    writer.close()
+
+    bvh = parseBVH((tmp_path / "spin.bvh").read_text())
+    assert bvh.nframes == 450
+    # Zrotation Xrotation Yrotation of the root, Y keeps climbing instead of jumping back at chunk edges
+    yaw = bvh.motion[:, 5]
+    assert np.allclose(np.diff(yaw), 2.5, atol=1e-3)
+    assert yaw[-1] == pytest.approx(2.5 * 449, abs=1e-3)
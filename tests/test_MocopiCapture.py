@@ -0,0 +1,27 @@
+import pytest
+
+from mocap.bench.Synthetic import framPacket
+from mocap.Reader.MocopiCapture import RECORD_HEADER, CaptureReader, indexPath
+from mocap.Writer.CaptureWriter import CaptureWriter
+
+
+def writeCapture(tmp_path, frames: int):
+    writer = CaptureWriter("take", output_base=tmp_path, clip_workers=0)
+    for f in range(frames):
+        writer.addPacket(1.7e9 + f / 50, ("127.0.0.1", 12351), framPacket(f))
+    writer.close()
+    return tmp_path / "take.smfcap"
+
+
+@pytest.mark.parametrize("cut", [1, 10, len(framPacket(0)), len(framPacket(0)) + RECORD_HEADER.size - 3])
+@pytest.mark.parametrize("withIndex", [True, False])
+def test_truncated_capture(tmp_path, cut, withIndex):
+    file = writeCapture(tmp_path, 5)
+    data = file.read_bytes()
+    file.write_bytes(data[:-cut])
+    if not withIndex:
+        indexPath(file).unlink()
+
+    records = list(CaptureReader(file))
+    assert [r[2] for r in records] == [framPacket(f) for f in range(4)]
+    assert records[0][1] == ("127.0.0.1", 12351)
@@ -0,0 +1,39 @@
+import numpy as np
+
+from mocap.bench.Synthetic import framPacket, packField, packHeader
+from mocap.Reader.MocopiUDP import decomposeMotionPackets
+
+
+def test_truncated_packet_is_skipped():
+    packets = [framPacket(f) for f in range(5)]
+    for broken in (packets[0][:-10], packets[0][:-3], packets[0][:100], bytes(len(packets[0]))):
+        for at in (0, 2, 5):
+            batch = list(packets)
+            batch.insert(at, broken)
+            assert decomposeMotionPackets(batch)["fnum"].tolist() == [0, 1, 2, 3, 4]
+
+
+def test_other_packet_of_the_same_length_first():
+    packets = [framPacket(f) for f in range(1, 5)]
+    other = packets[0].replace(b"fram", b"skdf")
+    assert len(other) == len(packets[0])
+    assert decomposeMotionPackets([other] + packets)["fnum"].tolist() == [1, 2, 3, 4]
+    assert decomposeMotionPackets(packets + [other])["fnum"].tolist() == [1, 2, 3, 4]
+
+
+def test_same_length_different_layout():
+    # uttm ahead of fnum: same length, both layouts are decoded and come back in arrival order
+    packet = framPacket(0)
+    btrs = packet[packet.index(b"btrs") - 4 :]
+    fram = (
+        packField(b"uttm", np.float64(1.7e9).tobytes())
+        + packField(b"fnum", np.uint32(7).tobytes())
+        + packField(b"time", np.float32(0).tobytes())
+        + btrs
+    )
+    reordered = packHeader() + packField(b"fram", fram)
+    assert len(reordered) == len(packet)
+
+    batch = decomposeMotionPackets([reordered, packet, framPacket(1)])
+    assert batch["fnum"].tolist() == [7, 0, 1]
+    assert np.allclose(batch["rotation"][0], batch["rotation"][1])
@@ -0,0 +1,56 @@
+import numpy as np
+from pxr import Gf, Usd, UsdSkel, Vt
+
+from mocap.bench.Synthetic import framPacket, skdfPacket
+from mocap.Reader.MocopiUDP import decomposePacket
+from mocap.udp import SMFReciever
+from mocap.Writer.RetargetWriter import RetargetWriter
+from mocap.Writer.skelTree import FlatSkeleton
+
+
+class RecordingWriter:
+    def __init__(self, mainFileBasename: str, **kwargs):
+        self.skeleton = None
+        self.samples = list()
+
+    def updateSkeleton(self, skeleton: list):
+        self.skeleton = skeleton
+
+    def addTimesample(self, sample: dict):
+        self.samples.append(sample)
+
+
+def makeCharacter(path):
+    # センター is not mapped, it sits between the mapped root and 上半身 with an offset of its own
+    stage = Usd.Stage.CreateNew(str(path))
+    skeleton = UsdSkel.Skeleton.Define(stage, "/Rig/Skeleton")
+    joints = ["a", "a/b", "a/b/c"]
+    skeleton.CreateJointsAttr(Vt.TokenArray(joints))
+    names = skeleton.CreateJointNamesAttr(Vt.TokenArray(joints))
+    names.SetCustomDataByKey("usdmmdplugins:originalJP", Vt.StringArray(["全ての親", "センター", "上半身"]))
+    names.SetCustomDataByKey("usdmmdplugins:originalEN", Vt.StringArray(["root", "center", "upper body"]))
+    offsets = [(0, 0, 0), (0, 2, 0), (0, 3, 1)]
+    skeleton.CreateRestTransformsAttr(
+        Vt.Matrix4dArray([Gf.Matrix4d(1).SetTranslateOnly(Gf.Vec3d(*o)) for o in offsets])
+    )
+    stage.Save()
+
+
+def test_unmapped_intermediate_joint(tmp_path, monkeypatch):
+    makeCharacter(tmp_path / "character.usda")
+    monkeypatch.setitem(SMFReciever.WRITERS, "recording", RecordingWriter)
+    writer = RetargetWriter("take", retarget_character=tmp_path / "character.usda", retarget_writer="recording")
+    writer.updateSkeleton(decomposePacket(skdfPacket())["skdf"]["btrs"])
+    writer.addTimesample(decomposePacket(framPacket(10))["fram"])
+
+    inner = writer._writer
+    skeleton = FlatSkeleton.fromSkdf(inner.skeleton)
+    assert skeleton.paths == ["a", "a/b", "a/b/c"]
+    assert np.allclose(skeleton.translations, [(0, 0, 0), (0, 2, 0), (0, 3, 1)])
+
+    btrs = inner.samples[0]["btrs"]
+    assert len(btrs) == 3
+    # the unmapped joint holds its rest pose, the mapped ones are solved
+    assert np.allclose(btrs[1]["tran"]["rotation"], (0, 0, 0, 1))
+    assert np.allclose(btrs[1]["tran"]["translation"], (0, 2, 0))
+    assert not np.allclose(btrs[2]["tran"]["rotation"], (0, 0, 0, 1))
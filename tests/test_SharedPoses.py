@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+import pytest
+
+from mocap.bench.Synthetic import framPacket, skdfPacket
+from mocap.Reader.MocopiUDP import decomposePacket
+from mocap.Reader.SharedPoses import SharedPoseReader, closePublishers
+from mocap.Writer.SharedMemoryWriter import SharedMemoryWriter
+
+
+@pytest.fixture
+def shmName():
+    name = f"smf_test_{os.getpid()}"
+    yield name
+    closePublishers()
+
+
+def writeFrames(name: str, frames):
+    writer = SharedMemoryWriter("127.0.0.1_12351", shm_name=name)
+    writer.updateSkeleton(decomposePacket(skdfPacket())["skdf"]["btrs"])
+    for f in frames:
+        writer.addTimesample(decomposePacket(framPacket(f))["fram"])
+    writer.close()
+
+
+def test_reader_survives_writer_reopen(shmName):
+    writeFrames(shmName, range(4))
+    reader = SharedPoseReader(shmName)
+    assert reader.latest()[:3] == (3, 0, 3)
+
+    # the suit went idle and came back, the receiver opens a new writer on the same ring
+    writeFrames(shmName, range(4, 9))
+    sequence, client, fnum, _, pose = reader.latest()
+    assert (sequence, fnum) == (8, 8)
+    assert np.isfinite(pose).all()
+    reader.close()
+
+
+def test_ring_is_released_at_shutdown(shmName):
+    writeFrames(shmName, range(2))
+    closePublishers()
+    with pytest.raises(FileNotFoundError):
+        SharedPoseReader(shmName)